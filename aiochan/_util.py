@@ -1,3 +1,7 @@
+import asyncio
+import threading
+
+
 class FnHandler:
     __slots__ = ('_f', '_blockable')
     active = True
@@ -35,6 +39,24 @@ class SelectFlag:
         self.active = False
 
 
+class ReusableSelectFlag(SelectFlag):
+    """
+    A select flag whose handlers can be re-armed after a round of selection completes.
+    """
+    __slots__ = ()
+
+    def commit(self, handler):
+        for h in self._handlers:
+            if h is not handler:
+                h.notify_inactive()
+        self.active = False
+
+    def reset(self):
+        for h in self._handlers:
+            h.active = True
+        self.active = True
+
+
 class SelectHandler:
     __slots__ = ('active', '_f', '_flag', '_chan', '_type')
     blockable = True
@@ -48,8 +70,9 @@ class SelectHandler:
         self._type = None
 
     def notify_inactive(self):
-        # noinspection PyProtectedMember
-        self._chan._notify_dirty(self._type)
+        if self._chan is not None:
+            # noinspection PyProtectedMember
+            self._chan._cancel(self, self._type)
         self.active = False
 
     def queue(self, chan, is_put):
@@ -59,3 +82,82 @@ class SelectHandler:
     def commit(self):
         self._flag.commit(self)
         return self._f
+
+
+class Completed:
+    """
+    A lightweight awaitable holding a result that is already available, used in place of a completed future.
+    """
+    __slots__ = ('_result',)
+
+    def __init__(self, result):
+        self._result = result
+
+    def __await__(self):
+        return self._result
+        # noinspection PyUnreachableCode
+        yield
+
+    __iter__ = __await__
+
+    def done(self):
+        return True
+
+    def cancelled(self):
+        return False
+
+    def result(self):
+        return self._result
+
+    def exception(self):
+        return None
+
+    def __repr__(self):
+        return '<Completed result=' + repr(self._result) + '>'
+
+
+class WithdrawingFuture(asyncio.Future):
+    """
+    A future that calls `withdraw` synchronously when it is cancelled, so that the op it stands for can be taken off
+    its channel before anything else gets the chance to complete it.
+    """
+
+    def __init__(self, withdraw, *, loop):
+        super().__init__(loop=loop)
+        self._withdraw = withdraw
+
+    def cancel(self, *args, **kwargs):
+        if not super().cancel(*args, **kwargs):
+            return False
+        self._withdraw()
+        return True
+
+
+class ThreadsafeCalls:
+    """
+    Runs callbacks submitted from other threads on the loop in batches: however many callbacks are submitted before the
+    loop gets to run them, only one `call_soon_threadsafe` wakeup is used.
+    """
+    __slots__ = ('_loop', '_lock', '_pending')
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def call(self, f, *args):
+        with self._lock:
+            self._pending.append((f, args))
+            wake = len(self._pending) == 1
+        if wake:
+            self._loop.call_soon_threadsafe(self._run)
+
+    def _run(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for f, args in pending:
+            # noinspection PyBroadException
+            try:
+                f(*args)
+            except Exception as exc:
+                self._loop.call_exception_handler({'message': 'Exception in callback ' + repr(f), 'exception': exc})
@@ -0,0 +1,205 @@
+# functions run inside the workers of parallel pipes. They are module level so that they can be pickled by reference.
+
+import importlib.util
+import threading
+
+# functions registered in this worker by `init_registered`, keyed by their id in the parent process
+_registered = {}
+
+
+def init_registered(fs, initializer=None, initargs=()):
+    _registered.update(fs)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def apply_chunk(f, chunk):
+    return [f(v) for v in chunk]
+
+
+def call_registered(key, v):
+    return _registered[key](v)
+
+
+def apply_chunk_registered(key, chunk):
+    f = _registered[key]
+    return [f(v) for v in chunk]
+
+
+# the actor of this worker, for `actor_pipe`. Each actor has a pool with a single worker, which in `thread` mode is a
+# thread of the parent process, hence the thread local.
+_actor = threading.local()
+
+
+def init_actor(factory, args, kwargs):
+    _actor.spec = (factory, args, kwargs)
+    _actor.instance = None
+
+
+def call_actor(v):
+    # the actor is only constructed when the first value arrives, so that errors in its construction and setup fail a
+    # job instead of the worker
+    actor = _actor.instance
+    if actor is None:
+        factory, args, kwargs = _actor.spec
+        actor = factory(*args, **kwargs)
+        actor.setup()
+        _actor.instance = actor
+    return actor.process(v)
+
+
+def teardown_actor():
+    actor = _actor.instance
+    _actor.instance = None
+    if actor is not None:
+        actor.teardown()
+
+
+# large buffers are moved through shared memory by the 'shm' transport of parallel pipes. Smaller values are cheaper to
+# send through the pool's pipe as usual.
+SHM_THRESHOLD = 1 << 21
+
+
+class ShmRef:
+    # `kind` is 'bytes', 'bytearray' or 'ndarray', the type the value is rebuilt as
+    __slots__ = ('name', 'size', 'kind', 'shape', 'dtype')
+
+    def __init__(self, name, size, kind, shape, dtype):
+        self.name = name
+        self.size = size
+        self.kind = kind
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getstate__(self):
+        return self.name, self.size, self.kind, self.shape, self.dtype
+
+    def __setstate__(self, state):
+        self.name, self.size, self.kind, self.shape, self.dtype = state
+
+
+def shm_available():
+    # `multiprocessing.shared_memory` is new in Python 3.8
+    return importlib.util.find_spec('multiprocessing.shared_memory') is not None
+
+
+def ensure_tracker():
+    # shared memory blocks are created and unlinked on both sides, which only balances out if the workers share the
+    # resource tracker of the parent, i.e. if it is already running when the workers are started
+    try:
+        from multiprocessing import resource_tracker
+    except ImportError:
+        return
+    resource_tracker.ensure_running()
+
+
+def _is_ndarray(v):
+    t = type(v)
+    return t.__name__ == 'ndarray' and t.__module__ == 'numpy'
+
+
+def to_shm(v):
+    # copy `v` into a new shared memory block if it is a large enough bytes-like object or numpy array
+    if isinstance(v, (bytes, bytearray)):
+        if len(v) < SHM_THRESHOLD:
+            return v
+        kind = 'bytearray' if isinstance(v, bytearray) else 'bytes'
+        shape = dtype = None
+    elif _is_ndarray(v):
+        if v.nbytes < SHM_THRESHOLD or v.dtype.hasobject:
+            return v
+        kind = 'ndarray'
+        shape = v.shape
+        dtype = v.dtype.str
+    else:
+        return v
+
+    from multiprocessing import shared_memory
+
+    size = len(v) if shape is None else v.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        if shape is None:
+            shm.buf[:size] = v
+        else:
+            import numpy
+            dst = numpy.ndarray(shape, dtype, buffer=shm.buf)
+            dst[...] = v
+            del dst
+    finally:
+        shm.close()
+    return ShmRef(shm.name, size, kind, shape, dtype)
+
+
+def _attach(ref):
+    from multiprocessing import shared_memory
+
+    return shared_memory.SharedMemory(ref.name)
+
+
+def _read(ref, shm, copy):
+    if ref.kind == 'bytearray':
+        return bytearray(shm.buf[:ref.size])
+    if ref.kind == 'bytes':
+        return bytes(shm.buf[:ref.size])
+    import numpy
+    v = numpy.ndarray(ref.shape, ref.dtype, buffer=shm.buf)
+    return v.copy() if copy else v
+
+
+def from_shm(v):
+    # the value referred to by `v`, copied out of shared memory, which is then released
+    if not isinstance(v, ShmRef):
+        return v
+    shm = _attach(v)
+    try:
+        return _read(v, shm, True)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def release_shm(v):
+    if isinstance(v, ShmRef):
+        shm = _attach(v)
+        shm.close()
+        shm.unlink()
+
+
+def call_shm(func, chunked, payload):
+    # run a job whose values may be in shared memory. Arrays are passed to the function as views on the shared memory
+    # instead of copies, and large results are sent back in new shared memory blocks.
+    handles = []
+
+    def open_(v):
+        if not isinstance(v, ShmRef):
+            return v
+        shm = _attach(v)
+        handles.append(shm)
+        return _read(v, shm, False)
+
+    args = [open_(v) for v in payload] if chunked else open_(payload)
+    try:
+        r = func(args)
+        return [to_shm(v) for v in r] if chunked else to_shm(r)
+    finally:
+        del args
+        for shm in handles:
+            try:
+                shm.close()
+            except BufferError:
+                # the function kept a view on its argument; the mapping is released when the view is collected
+                pass
+
+
+def encode_payload(data, chunked):
+    return [to_shm(v) for v in data] if chunked else to_shm(data)
+
+
+def release_payload(payload, chunked):
+    for v in (payload if chunked else (payload,)):
+        release_shm(v)
+
+
+def decode_result(r, chunked):
+    return [from_shm(v) for v in r] if chunked else from_shm(r)
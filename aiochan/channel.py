@@ -1,5 +1,6 @@
 import asyncio
 import collections
+import functools
 import itertools
 import multiprocessing
 import multiprocessing.dummy
@@ -9,32 +10,56 @@ import queue
 import random
 import threading
 
-from . import buffers
-from ._util import FnHandler, SelectFlag, SelectHandler
+from . import _worker, buffers, timers, xform
+from ._util import Completed, FnHandler, ReusableSelectFlag, SelectFlag, SelectHandler, ThreadsafeCalls, \
+    WithdrawingFuture
 
 _buf_types = {'f': buffers.FixedLengthBuffer,
               'd': buffers.DroppingBuffer,
               's': buffers.SlidingBuffer,
               'p': buffers.PromiseBuffer}
 
-__all__ = ('Chan', 'select', 'merge', 'from_iter', 'from_range', 'zip_chans', 'combine_latest', 'tick_tock', 'timeout',
-           'Dup', 'Pub', 'go', 'nop', 'run_in_thread', 'run')
+__all__ = ('Chan', 'ChanOverflowError', 'select', 'Selector', 'merge', 'from_iter', 'from_range', 'zip_chans',
+           'combine_latest', 'tick_tock', 'timeout', 'Pipeline', 'WorkerPool', 'Actor', 'AdaptiveLimit', 'Dup', 'Pub',
+           'go', 'nop', 'run_in_thread', 'run')
 
 MAX_OP_QUEUE_SIZE = 1024
 """
-The maximum pending puts or pending takes for a channel.
+The default maximum pending puts or pending takes for a channel, used when `max_pending` is not given when creating
+the channel.
 
 Usually you should leave this option as it is. If you find yourself receiving exceptions due to put/get queue size
-exceeding limits, you should consider using appropriate :mod:`aiochan.buffers` when creating the channels.
+exceeding limits, you should consider using appropriate :mod:`aiochan.buffers` when creating the channels, or choosing
+a different `overflow` policy for the channel.
 """
 
 MAX_DIRTY_SIZE = 256
 """
-The size of cancelled operations in put/get queues before a cleanup is triggered (an operation can only become cancelled
-due to the :meth:`aiochan.channel.select` or operations using it, or in other words, there is no direct user control of
-cancellation).
+No longer used: cancelled operations are now removed from the put/get queues as soon as they are cancelled, so there is
+no cleanup to trigger. Kept so that code referring to it keeps working.
 """
 
+_overflow_policies = ('raise', 'shed_oldest', 'shed_newest', 'grow')
+
+
+class ChanOverflowError(Exception):
+    """
+    Raised when an operation would exceed the maximum number of pending puts or gets of a channel whose overflow
+    policy is `'raise'`.
+    """
+
+
+_IMMEDIATE = FnHandler(None, blockable=False)
+
+
+class _Failed:
+    # stands in for the result of a pipe job that failed after all its retries
+    __slots__ = ('values', 'exc')
+
+    def __init__(self, values, exc):
+        self.values = values
+        self.exc = exc
+
 
 class Chan:
     """
@@ -58,6 +83,23 @@ class Chan:
             in this case the channel can operate if you use only :meth:`aiochan.channel.Chan.get_nowait` and
             :meth:`aiochan.channel.Chan.put_nowait`.
     :param name: used to provide more friendly debugging outputs.
+    :param max_pending: the maximum number of pending puts, and separately of pending gets, that can be queued on the
+            channel. If `None`, :data:`aiochan.channel.MAX_OP_QUEUE_SIZE` is used.
+    :param overflow: what to do when a put or get would have to be queued but there are already `max_pending` such
+            operations pending. `'raise'` raises :class:`aiochan.channel.ChanOverflowError`; `'shed_oldest'` completes
+            the oldest pending operation as if the channel were closed (puts yield `False`, gets yield `None`) to make
+            room for the new one; `'shed_newest'` completes the new operation in the same way instead of queueing it;
+            `'grow'` ignores `max_pending` and queues without limit (producers are still suspended until their puts
+            complete, which is the natural back pressure for coroutines).
+    :param xform: a transducer from :mod:`aiochan.xform` that is applied synchronously to the values as they are added
+            to the buffer, so a chain of transformations costs no extra coroutines or channels. Requires a buffer that
+            can hold at least one value, since values handed directly from putters to getters bypass the buffer. The
+            buffer may hold more values than its size if the transducer expands values. If the transducer stops
+            accepting values (e.g. :func:`aiochan.xform.take`), the channel is closed. Stateful transducers are flushed
+            when the channel is closed.
+    :param ex_handler: a function called with the exception if the transducer raises. If it returns a value other
+            than `None`, that value is added to the buffer instead. If not given, the exception is reported to the
+            loop's exception handler and the value is dropped.
     """
 
     _count = 0
@@ -67,7 +109,13 @@ class Chan:
                  buffer_size=None,
                  *,
                  loop=None,
-                 name=None):
+                 name=None,
+                 max_pending=None,
+                 overflow='raise',
+                 xform=None,
+                 ex_handler=None):
+        if overflow not in _overflow_policies:
+            raise ValueError('overflow must be one of ' + ', '.join(_overflow_policies))
         self._name = name or '_unk' + '_' + str(self.__class__._count)
         if loop == 'no_loop':
             self.loop = None
@@ -83,23 +131,101 @@ class Chan:
             else:
                 self._buf = buffer
 
+        if xform is None:
+            self._rf = None
+        else:
+            # values handed directly from pending putters to getters would bypass the transducer
+            if self._buf is None or not self._buf.can_add:
+                raise ValueError('xform requires a buffer that can hold at least one value')
+            self._rf = xform(self._buf_add)
+            self._ex_handler = ex_handler or self._report_ex
+            self._reduced = False
         self._delivered_immediate = 0
         self._delivered_buffered = 0
         self._delivered_queued = 0
-        self._gets = collections.deque()
-        self._puts = collections.deque()
+        # pending ops, in arrival order: handler -> value for puts, handler -> None for gets. Using ordered dicts
+        # instead of deques allows cancelled (select) handlers to be removed in O(1) time.
+        self._gets = collections.OrderedDict()
+        self._puts = collections.OrderedDict()
         self._closed = False
-        self._dirty_puts = 0
-        self._dirty_gets = 0
+        self._max_pending = MAX_OP_QUEUE_SIZE if max_pending is None else max_pending
+        self._overflow = overflow
+        self._watchers = None
         self.__class__._count += 1
 
-    def _notify_dirty(self, is_put):
+    def _buf_add(self, val):
+        # the innermost reducing function of the transducer
+        if val is not None:
+            self._buf.add(val)
+        return True
+
+    def _report_ex(self, exc):
+        self.loop.call_exception_handler({'message': 'Exception in xform of channel ' + repr(self),
+                                          'exception': exc})
+
+    def _xadd(self, val):
+        # add `val` to the buffer through the transducer. Returns `False` if no more values will be accepted.
+        try:
+            return self._rf(val)
+        except Exception as exc:
+            ret = self._ex_handler(exc)
+            if ret is not None:
+                self._buf.add(ret)
+            return True
+
+    def _xcomplete(self):
+        # called on closing: pending puts are pushed through the transducer, failing once it no longer accepts values,
+        # then the transducer is flushed
+        while self._puts:
+            putter, val = self._puts.popitem(last=False)
+            if self._reduced:
+                self._dispatch(putter.commit(), False)
+            else:
+                self._reduced = not self._xadd(val)
+                self._dispatch(putter.commit(), True)
+        self._xadd(None)
+
+    def _cancel(self, handler, is_put):
         if is_put:
-            self._dirty_puts += 1
-            # print('notified put', self._dirty_puts)
+            self._puts.pop(handler, None)
         else:
-            self._dirty_gets += 1
-            # print('notified get', self._dirty_gets)
+            self._gets.pop(handler, None)
+
+    def _watch(self, f):
+        # `f(chan)` will be called whenever a value may have become available for taking without a getter to take it
+        if self._watchers is None:
+            self._watchers = []
+        self._watchers.append(f)
+
+    def _unwatch(self, f):
+        if self._watchers:
+            try:
+                self._watchers.remove(f)
+            except ValueError:
+                pass
+
+    def _notify_watchers(self):
+        for f in tuple(self._watchers):
+            f(self)
+
+    def _takeable(self):
+        return bool(self._puts) or self._closed or bool(self._buf and self._buf.can_take)
+
+    def _make_room(self, is_put):
+        # called when a put or get op is about to be queued. Returns `True` if it can be queued, `False` if it should
+        # instead complete immediately as if the channel were closed.
+        ops = self._puts if is_put else self._gets
+        if len(ops) < self._max_pending or self._overflow == 'grow':
+            return True
+        if self._overflow == 'shed_newest':
+            return False
+        if self._overflow == 'shed_oldest':
+            oldest, _ = ops.popitem(last=False)
+            self._dispatch(oldest.commit(), False if is_put else None)
+            return True
+        raise ChanOverflowError('No more than ' + str(self._max_pending) + ' pending ' +
+                                ('puts' if is_put else 'gets') + ' are allowed on channel ' + repr(self) +
+                                '. Consider using a windowed buffer or a different overflow policy.')
 
     def _dispatch(self, f, value=None):
         self._check_exhausted()
@@ -118,14 +244,6 @@ class Chan:
         if self._closed and (not len(self._puts)) and (not self._buf or not self._buf.can_take):
             self._close_event.set()
 
-    def _clean_gets(self):
-        self._gets = collections.deque(g for g in self._gets if g.active)
-        self._dirty_gets = 0
-
-    def _clean_puts(self):
-        self._puts = collections.deque(p for p in self._puts if p[0].active)
-        self._dirty_puts = 0
-
     # noinspection PyRedundantParentheses
     def _put(self, val, handler):
         if val is None:
@@ -138,28 +256,26 @@ class Chan:
         if self._buf and self._buf.can_add:
             # print('put op: buffer')
             handler.commit()
-            self._buf.add(val)
+            if self._rf is None:
+                self._buf.add(val)
+                more = True
+            else:
+                more = self._xadd(val)
             while self._gets and self._buf.can_take:
-                getter = self._gets.popleft()
-                if getter.active:
-                    self._dispatch(getter.commit(), self._buf.take())
-                    self._delivered_queued += 1
+                getter, _ = self._gets.popitem(last=False)
+                self._dispatch(getter.commit(), self._buf.take())
+                self._delivered_queued += 1
+            if self._watchers and self._buf.can_take:
+                self._notify_watchers()
+            if not more:
+                self._reduced = True
+                self.close()
             return (True,)
 
-        getter = None
-        while True:
-            try:
-                g = self._gets.popleft()
-                if g and g.active:
-                    getter = g
-                    break
-            except IndexError:
-                self._dirty_gets = 0
-                break
-
         # case 2: no buffer and pending getter, dispatch immediately
-        if getter is not None:
+        if self._gets:
             # print('put op: dispatch immediate to getter')
+            getter, _ = self._gets.popitem(last=False)
             handler.commit()
             self._dispatch(getter.commit(), val)
             self._delivered_queued += 1
@@ -168,13 +284,13 @@ class Chan:
         # case 3: no buffer, no pending getter, queue put op if put is blockable
         if handler.blockable:
             # print('put op: queue put')
-            if self._dirty_puts >= MAX_DIRTY_SIZE:
-                self._clean_puts()
-            assert len(self._puts) < MAX_OP_QUEUE_SIZE, \
-                'No more than ' + str(MAX_OP_QUEUE_SIZE) + ' pending puts are ' + \
-                'allowed on a single channel. Consider using a windowed buffer.'
+            if not self._make_room(True):
+                handler.commit()
+                return (False,)
             handler.queue(self, True)
-            self._puts.append((handler, val))
+            self._puts[handler] = val
+            if self._watchers:
+                self._notify_watchers()
             return None
 
     # noinspection PyRedundantParentheses
@@ -187,37 +303,30 @@ class Chan:
             # print('get op: get from buffer')
             handler.commit()
             val = self._buf.take()
-            while self._buf.can_add:
-                try:
-                    putter = self._puts.popleft()
-                    if putter[0].active:
-                        self._buf.add(putter[1])
-                        self._dispatch(putter[0].commit(), True)
-                except IndexError:
-                    self._dirty_puts = 0
-                    break
+            while self._puts and self._buf.can_add:
+                putter, put_val = self._puts.popitem(last=False)
+                if self._rf is None:
+                    self._buf.add(put_val)
+                    self._dispatch(putter.commit(), True)
+                else:
+                    more = self._xadd(put_val)
+                    self._dispatch(putter.commit(), True)
+                    if not more:
+                        self._reduced = True
+                        self.close()
+                        break
             self._check_exhausted()
             self._delivered_buffered += 1
             return (val,)
 
-        putter = None
-        while True:
-            try:
-                p = self._puts.popleft()
-                if p[0].active:
-                    putter = p
-                    break
-            except IndexError:
-                self._dirty_puts = 0
-                break
-
         # case 2: we have a putter immediately available
-        if putter is not None:
+        if self._puts:
             # print('get op: get immediate from putter')
+            putter, put_val = self._puts.popitem(last=False)
             handler.commit()
-            self._dispatch(putter[0].commit(), True)
+            self._dispatch(putter.commit(), True)
             self._delivered_immediate += 1
-            return (putter[1],)
+            return (put_val,)
 
         # case c: we are closed and no buffer
         if self.closed:
@@ -229,13 +338,11 @@ class Chan:
         # case 3: cannot deal with getter immediately: queue if blockable
         if handler.blockable:
             # print('get op: queue get op')
-            if self._dirty_gets >= MAX_DIRTY_SIZE:
-                self._clean_gets()
-            assert len(self._gets) < MAX_OP_QUEUE_SIZE, \
-                'No more than ' + str(MAX_OP_QUEUE_SIZE) + ' pending gets ' + \
-                'are allowed on a single channel'
+            if not self._make_room(False):
+                handler.commit()
+                return (None,)
             handler.queue(self, False)
-            self._gets.append(handler)
+            self._gets[handler] = None
             return None
 
     def __aiter__(self):
@@ -244,20 +351,53 @@ class Chan:
     def __repr__(self):
         return 'Chan<' + self._name + ' ' + str(id(self)) + '>'
 
-    def put(self, val):
+    def _timed_op(self, op, seconds):
+        # queue `op` with a handler that is withdrawn from the channel if it does not complete within `seconds`, or as
+        # soon as the future is cancelled: a done-callback would leave a gap in which the op could still complete
+        flag = SelectFlag()
+
+        def deliver(v):
+            handle.cancel()
+            if not ft.done():
+                ft.set_result(v)
+
+        def timed_out():
+            if flag.active:
+                flag.commit(None)
+                ft.set_result(None)
+
+        def withdraw():
+            handle.cancel()
+            if flag.active:
+                flag.commit(None)
+
+        ret = op(SelectHandler(deliver, flag))
+        if ret is not None:
+            return Completed(ret[0])
+        ft = WithdrawingFuture(withdraw, loop=self.loop)
+        handle = self.loop.call_later(seconds, timed_out)
+        return ft
+
+    def put(self, val, *, timeout=None):
         """
         **Coroutine**. Put a value into the channel.
 
         :param val: value to put into the channel. Cannot be `None`.
+        :param timeout: if not `None`, the maximum number of seconds to wait. If the op cannot complete in time, it is
+                        withdrawn from the channel and the result is `None`.
         :return: Awaitable of `True` if the op succeeds before the channel is closed, `False` if the op is applied to a
-                 then-closed channel.
+                 then-closed channel. If the op completes immediately, the awaitable is a lightweight completed object
+                 instead of a future.
         """
-        ft = self.loop.create_future()
-        ret = self._put(val, FnHandler(ft, blockable=True))
-        if ret is not None:
+        ret = self._put(val, _IMMEDIATE)
+        if ret is None:
+            if timeout is not None:
+                return self._timed_op(functools.partial(self._put, val), timeout)
             ft = self.loop.create_future()
-            ft.set_result(ret[0])
-        return ft
+            ret = self._put(val, FnHandler(ft, blockable=True))
+            if ret is None:
+                return ft
+        return Completed(ret[0])
 
     def put_nowait(self, val, cb=None, *, immediate_only=True):
         """
@@ -274,7 +414,7 @@ class Chan:
         """
         if immediate_only:
             assert cb is None, 'cb must be None if immediate_only is True'
-            ret = self._put(val, FnHandler(None, blockable=False))
+            ret = self._put(val, _IMMEDIATE)
             if ret:
                 return ret[0]
             else:
@@ -294,7 +434,7 @@ class Chan:
         as :meth:`aiochan.channel.Chan.put_nowait` with `immediate_only=False`.
 
         Note that this method can potentially overflow the channel's put queue, so it is only suitable for
-        adding small number of elements.
+        adding small number of elements. For large numbers of elements, use :meth:`aiochan.channel.Chan.put_many`.
 
         :param vals: values to add, none of which can be `None`.
         :return: `self`
@@ -303,18 +443,67 @@ class Chan:
             self.put_nowait(v, immediate_only=False)
         return self
 
-    def get(self):
+    async def put_many(self, vals):
+        """
+        **Coroutine**. Put all values in `vals` into the channel, in order.
+
+        As many values as the buffer and the pending getters allow are put synchronously in one go, and the coroutine
+        only blocks for the values that cannot be put immediately. Unlike :meth:`aiochan.channel.Chan.add`, at most one
+        put operation is ever queued on the channel.
+
+        :param vals: an iterable of values to put, none of which can be `None`.
+        :return: `True` if all values are put before the channel is closed, `False` otherwise.
+        """
+        for v in vals:
+            ret = self._put(v, _IMMEDIATE)
+            if ret is None:
+                ret = (await self.put(v),)
+            if not ret[0]:
+                return False
+        return True
+
+    async def get_many(self, max_n):
+        """
+        **Coroutine**. Get at most `max_n` values from the channel.
+
+        All values that are available immediately (from the buffer or from pending putters) are taken synchronously.
+        The coroutine only blocks if no value is available at all, in which case it waits for a single value and
+        then takes whatever else has become available.
+
+        :param max_n: the maximum number of values to get.
+        :return: a list of values, which is empty if and only if the channel is closed and exhausted.
+        """
+        result = []
+        while len(result) < max_n:
+            ret = self._get(_IMMEDIATE)
+            if ret is None:
+                if result:
+                    break
+                ret = (await self.get(),)
+            if ret[0] is None:
+                break
+            result.append(ret[0])
+        return result
+
+    def get(self, *, timeout=None):
         """
         **Coroutine**. Get a value of of the channel.
 
-        :return: An awaitable holding the obtained value, or of `None` if the channel is closed before succeeding.
+        :param timeout: if not `None`, the maximum number of seconds to wait. If no value is obtained in time, the op is
+                        withdrawn from the channel and the result is `None`. This is cheaper than selecting on the
+                        channel together with :meth:`aiochan.channel.timeout`.
+        :return: An awaitable holding the obtained value, or of `None` if the channel is closed before succeeding. If
+                 the op completes immediately, the awaitable is a lightweight completed object instead of a future.
         """
-        ft = self.loop.create_future()
-        ret = self._get(FnHandler(ft, blockable=True))
-        if ret is not None:
+        ret = self._get(_IMMEDIATE)
+        if ret is None:
+            if timeout is not None:
+                return self._timed_op(self._get, timeout)
             ft = self.loop.create_future()
-            ft.set_result(ret[0])
-        return ft
+            ret = self._get(FnHandler(ft, blockable=True))
+            if ret is None:
+                return ft
+        return Completed(ret[0])
 
     def get_nowait(self, cb=None, *, immediate_only=True):
         """
@@ -330,7 +519,7 @@ class Chan:
         """
         if immediate_only:
             assert cb is None, 'cb must be None if immediate_only is True'
-            ret = self._get(FnHandler(None, blockable=False))
+            ret = self._get(_IMMEDIATE)
             if ret:
                 return ret[0]
             else:
@@ -359,18 +548,17 @@ class Chan:
         """
         if self._closed:
             return self
-        while True:
-            try:
-                getter = self._gets.popleft()
-                if getter.active:
-                    val = self._buf.take() if self._buf and self._buf.can_take else None
-                    self._dispatch(getter.commit(), val)
-                    self._delivered_queued += 1
-            except IndexError:
-                self._dirty_gets = 0
-                break
+        if self._rf is not None:
+            self._xcomplete()
+        while self._gets:
+            getter, _ = self._gets.popitem(last=False)
+            val = self._buf.take() if self._buf and self._buf.can_take else None
+            self._dispatch(getter.commit(), val)
+            self._delivered_queued += 1
         self._closed = True
         self._check_exhausted()
+        if self._watchers:
+            self._notify_watchers()
         return self
 
     @property
@@ -442,7 +630,37 @@ class Chan:
         self.loop.create_task(f(self, out))
         return out
 
-    def async_pipe(self, n, f, out=None, buffer=None, buffer_size=None, *, close=True):
+    async def _pipe_apply(self, f, v, limit, retries, backoff):
+        # `await f(v)` for the async pipes, holding a slot of `limit` during each attempt and retrying failures
+        attempt = 0
+        while True:
+            token = None if limit is None else await limit.acquire()
+            try:
+                return await f(v)
+            except asyncio.CancelledError:
+                # an `Exception` before Python 3.8, but never a failure of `f`
+                raise
+            except Exception:
+                if attempt >= retries:
+                    raise
+            finally:
+                if limit is not None:
+                    limit.release(token)
+            await asyncio.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+    async def _pipe_failed(self, error_out, values, exc, report=True):
+        # route the values of a failed pipe job to `error_out`, or to the exception handler of the loop
+        if error_out is not None:
+            for v in values:
+                if not await error_out.put((v, exc)):
+                    break
+        elif report:
+            self.loop.call_exception_handler({'message': 'Exception in pipe function applied to ' + repr(values),
+                                              'exception': exc})
+
+    def async_pipe(self, n, f, out=None, buffer=None, buffer_size=None, *, close=True, window=None, error_out=None,
+                   retries=0, backoff=0.1):
         """
         Asynchronously apply the coroutine function `f` to each value in the channel, and pipe the results to `out`.
         The results will be processed in unspecified order but will be piped into `out` in the order of their inputs.
@@ -451,50 +669,94 @@ class Chan:
 
         If ordering is not important, consider using `async_pipe_unordered`.
 
-        :param n: how many coroutines to spawn for processing.
+        :param n: how many coroutines to spawn for processing, or an :class:`aiochan.channel.AdaptiveLimit` to
+                  adapt the number of values processed at the same time to the latency of `f`.
         :param f: a coroutine function accepting one input value and returning one output value. S
                   hould never return `None`.
         :param out: the output channel. if `None`, one without buffer will be created and used.
         :param buffer: buffer of the internal channel, only applies if out is `None`
         :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
         :param close: whether to close the output channel when the input channel is closed.
+        :param window: the maximum number of values that can be in flight at any time, counting from the oldest value
+                       whose result has not yet been put into `out`. This bounds the memory held by results completed
+                       out of order. If `None`, `2 * n` is used. Must be at least `n` to keep all coroutines busy.
+        :param error_out: if given, values for which `f` fails (after all retries) are put into this channel as
+                          `(value, exception)` pairs and processing continues with the next value. If `None`, failures
+                          are reported to the exception handler of the loop and the value is dropped. Closed together
+                          with `out`.
+        :param retries: how many times to retry `f` on a value for which it raised an exception.
+        :param backoff: the delay in seconds before the first retry, doubled for each subsequent retry of the same
+                        value.
         :return: the output channel.
         """
         if out is None:
             out = Chan(buffer, buffer_size)
+        limit = None
+        if isinstance(n, AdaptiveLimit):
+            limit, n = n, n.max_limit
+        if window is None:
+            window = 2 * n
+        elif window < n:
+            raise ValueError('window must be at least n')
 
         jobs = Chan(n, loop=self.loop)
-        results = Chan(n, loop=self.loop)
+        done = {}
+        next_out = 0
+        pending = n
+        window_open = None
 
         async def job_in():
+            nonlocal window_open
+            seq = 0
             async for v in self:
-                res = Chan('p')
-                await jobs.put((v, res))
-                await results.put(res)
+                if seq - next_out >= window:
+                    window_open = self.loop.create_future()
+                    await window_open
+                if not await jobs.put((seq, v)):
+                    break
+                seq += 1
             jobs.close()
-            results.close()
 
         async def worker():
-            async for v, res in jobs:
-                r = await f(v)
-                await res.put(r)
-
-        async def job_out():
-            async for rc in results:
-                r = await rc.get()
-                if not await out.put(r):
-                    break
-            if close:
-                out.close()
+            nonlocal next_out, pending
+            async for seq, v in jobs:
+                try:
+                    done[seq] = await self._pipe_apply(f, v, limit, retries, backoff)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    done[seq] = _Failed((v,), exc)
+                # the worker completing the oldest outstanding value puts it and all consecutive completed results
+                # into `out`, while the other workers carry on
+                if seq == next_out:
+                    while next_out in done:
+                        r = done.pop(next_out)
+                        if isinstance(r, _Failed):
+                            await self._pipe_failed(error_out, r.values, r.exc)
+                        elif not await out.put(r):
+                            jobs.close()
+                            break
+                        next_out += 1
+                        if window_open is not None and not window_open.done():
+                            window_open.set_result(True)
+            pending -= 1
+            if pending == 0:
+                # `out` may have closed early: let `job_in` find `jobs` closed instead of waiting for the window
+                if window_open is not None and not window_open.done():
+                    window_open.set_result(False)
+                if close:
+                    out.close()
+                    if error_out is not None:
+                        error_out.close()
 
-        self.loop.create_task(job_out())
         self.loop.create_task(job_in())
         for _ in range(n):
             self.loop.create_task(worker())
 
         return out
 
-    def async_pipe_unordered(self, n, f, out=None, buffer=None, buffer_size=None, *, close=True):
+    def async_pipe_unordered(self, n, f, out=None, buffer=None, buffer_size=None, *, close=True, error_out=None,
+                             retries=0, backoff=0.1):
         """
         Asynchronously apply the coroutine function `f` to each value in the channel, and pipe the results to `out`.
         The results will be put into `out` in an unspecified order: whichever result completes first will be given
@@ -504,28 +766,48 @@ class Chan:
 
         If ordering is not important, consider using `async_pipe`.
 
-        :param n: how many coroutines to spawn for processing.
+        :param n: how many coroutines to spawn for processing, or an :class:`aiochan.channel.AdaptiveLimit` to
+                  adapt the number of values processed at the same time to the latency of `f`.
         :param f: a coroutine function accepting one input value and returning one output value.
                   Should never return `None`.
         :param out: the output channel. if `None`, one without buffer will be created and used.
         :param buffer: buffer of the internal channel, only applies if out is `None`
         :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
         :param close: whether to close the output channel when the input channel is closed.
+        :param error_out: if given, values for which `f` fails (after all retries) are put into this channel as
+                          `(value, exception)` pairs and processing continues with the next value. If `None`, failures
+                          are reported to the exception handler of the loop and the value is dropped. Closed together
+                          with `out`.
+        :param retries: how many times to retry `f` on a value for which it raised an exception.
+        :param backoff: the delay in seconds before the first retry, doubled for each subsequent retry of the same
+                        value.
         :return: the output channel.
         """
         if out is None:
             out = Chan(buffer, buffer_size)
 
+        limit = None
+        if isinstance(n, AdaptiveLimit):
+            limit, n = n, n.max_limit
+
         pending = n
 
         async def work():
             nonlocal pending
             async for v in self:
-                r = await f(v)
+                try:
+                    r = await self._pipe_apply(f, v, limit, retries, backoff)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    await self._pipe_failed(error_out, (v,), exc)
+                    continue
                 await out.put(r)
             pending -= 1
             if pending == 0 and close:
                 out.close()
+                if error_out is not None:
+                    error_out.close()
 
         for _ in range(n):
             self.loop.create_task(work())
@@ -534,7 +816,8 @@ class Chan:
 
     def parallel_pipe(self, n, f, out=None, buffer=None, buffer_size=None, close=True, flatten=False,
                       mode='process', mp_module=multiprocessing, pool_args=None,
-                      pool_kwargs=None, error_cb=None, pool_buffer=None):
+                      pool_kwargs=None, error_cb=None, pool_buffer=None, pool=None, chunksize=None,
+                      register=False, transport='pipe', error_out=None, retries=0, backoff=0.1):
 
         """
         Apply the plain function `f` to each value in the channel, and pipe the results to `out`.
@@ -549,7 +832,9 @@ class Chan:
 
         If ordering is important, consider using `parallel_pipe`.
 
-        :param n: the parallelism of the pool executor (number of threads or number of processes).
+        :param n: the parallelism of the pool executor (number of threads or number of processes). Can also be an
+                  :class:`aiochan.channel.AdaptiveLimit`, in which case the pool has `max_limit` workers but the
+                  number of jobs in flight adapts to their latency, and `pool_buffer` is ignored.
         :param f: a plain function accepting one input value and returning one output value. Should never return `None`.
         :param out: the output channel. if `None`, one without buffer will be created and used.
         :param buffer: buffer of the internal channel, only applies if out is `None`
@@ -562,71 +847,122 @@ class Chan:
                           (for example, `torch.multiprocessing` from pytorch).
         :param pool_args: additional arguments when creating pool
         :param pool_kwargs: additional keyword arguments when creating pool
-        :param error_cb: callback in case there is an error
+        :param error_cb: if given, called on the loop with the exception of every job that fails after all retries.
         :param pool_buffer: the number of jobs that can be over-committed to the pool
+        :param pool: a :class:`aiochan.channel.WorkerPool` to run `f` in. If given, no pool is created and `mode`,
+                     `mp_module`, `pool_args` and `pool_kwargs` are ignored, and `n` only limits how many jobs of this
+                     pipe are in flight at the same time. The pool is not shut down when the pipe completes. If `None`,
+                     a pool private to this pipe is created.
+        :param chunksize: if given, values are sent to the workers in chunks of at most `chunksize` values, which
+                          amortises the cost of sending jobs and results between processes when `f` is cheap. The
+                          chunks are adaptive: a chunk holds the values that are available immediately when it is
+                          formed, so a chunk is only full if the input is faster than the pool. `n` and `pool_buffer`
+                          then count chunks instead of values.
+        :param register: if `True`, `f` is sent to each worker only once, when the pool starts, instead of with
+                         every job. Use this when `f` is expensive to pickle, e.g. a closure over a large table. Only
+                         applies if `pool` is `None`: for a shared pool, pass `f` in the `register` argument of
+                         :class:`aiochan.channel.WorkerPool` instead, after which all pipes using `f` on that pool
+                         benefit.
+        :param transport: how values and results are sent between the loop and worker processes. With `'pipe'`, they
+                          are pickled through the pool's pipes. With `'shm'`, large `bytes`, `bytearray` and `numpy`
+                          arrays (at least 2 MiB) are instead copied into `multiprocessing.shared_memory` blocks,
+                          and only the names of the blocks go through the pipes. In the workers, `f` receives arrays
+                          as views on the shared memory, without copying. Has no effect in `thread` mode. Otherwise
+                          requires Python 3.8 or later: on earlier versions, a `ValueError` is raised.
+        :param error_out: if given, values for which `f` fails (after all retries) are put into this channel as
+                          `(value, exception)` pairs and processing continues. With `chunksize`, a failure fails the
+                          whole chunk, and each of its values is put. If `None` and `error_cb` is `None`, failures are
+                          reported to the exception handler of the loop and the values are dropped. Closed together
+                          with `out`.
+        :param retries: how many times to resubmit a job that raised an exception.
+        :param backoff: the delay in seconds before the first retry, doubled for each subsequent retry of the same
+                        job.
         :return: the output channel.
         """
+        if transport not in ('pipe', 'shm'):
+            raise ValueError("transport must be one of 'pipe', 'shm'")
+
         if out is None:
             out = Chan(buffer, buffer_size)
 
-        if pool_args is None:
-            pool_args = ()
-
-        if pool_kwargs is None:
-            pool_kwargs = {}
-
-        if error_cb is None:
-            def error_cb(err):
-                def reraise():
-                    raise err
-
-                self.loop.call_soon_threadsafe(reraise)
-
         if pool_buffer is None:
             if flatten:
                 pool_buffer = 0
             else:
                 pool_buffer = 1
 
+        if isinstance(n, AdaptiveLimit):
+            in_flight, n = n, n.max_limit
+        else:
+            in_flight = _FixedLimit(n + pool_buffer, self.loop)
+
         results_chan = Chan(n, loop=self.loop)
 
-        if mode == 'thread':
-            Pool = multiprocessing.dummy.Pool
-        else:
-            Pool = mp_module.Pool
-        pool = Pool(n, *pool_args, **pool_kwargs)
+        use_shm = transport == 'shm' and (mode if pool is None else pool._mode) != 'thread'
+        if use_shm and not _worker.shm_available():
+            raise ValueError("transport='shm' requires multiprocessing.shared_memory, available from Python 3.8")
+
+        own_pool = pool is None
+        if own_pool:
+            pool = WorkerPool(n, mode, mp_module=mp_module, pool_args=pool_args, pool_kwargs=pool_kwargs,
+                              register=(f,) if register else ())
 
-        in_flight = asyncio.Semaphore(n + pool_buffer, loop=self.loop)
+        # completions from the pool are handed to the loop in batches
+        completions = ThreadsafeCalls(self.loop)
 
-        def complete_callback(ft):
-            def wrapped(r):
-                self.loop.call_soon_threadsafe(ft.set_result, r)
+        func = pool._job(f, chunksize is not None)
 
-            return wrapped
+        def submit(data, ft, attempt):
+            pool._submit(func, data, chunksize is not None, use_shm,
+                         lambda r: completions.call(ft.set_result, r),
+                         lambda err: completions.call(retry_or_fail, data, ft, attempt, err))
+
+        def retry_or_fail(data, ft, attempt, err):
+            # the slot of the job stays taken while it is retried
+            if attempt < retries:
+                self.loop.call_later(backoff * 2 ** attempt, submit, data, ft, attempt + 1)
+            else:
+                ft.set_result(_Failed(data if chunksize is not None else (data,), err))
 
         async def pipe_in_worker():
-            async for data in self:
-                await in_flight.acquire()
+            while True:
+                if chunksize is None:
+                    data = await self.get()
+                else:
+                    data = (await self.get_many(chunksize)) or None
+                if data is None:
+                    break
+                token = await in_flight.acquire()
                 ft = self.loop.create_future()
-                pool.apply_async(f, (data,), callback=complete_callback(ft), error_callback=error_cb)
-                await results_chan.put(ft)
+                submit(data, ft, 0)
+                await results_chan.put((ft, token))
 
-            for i in range(n + pool_buffer):
-                await in_flight.acquire()
-            pool.close()
+            await in_flight.idle()
+            if own_pool:
+                pool.close()
             results_chan.close()
 
         async def order_out_worker():
-            async for async_ft in results_chan:
+            async for async_ft, token in results_chan:
                 item = await async_ft
-                if flatten:
-                    for data in item:
-                        await out.put(data)
-                else:
-                    await out.put(item)
-                in_flight.release()
+                if isinstance(item, _Failed):
+                    if error_cb is not None:
+                        error_cb(item.exc)
+                    await self._pipe_failed(error_out, item.values, item.exc, report=error_cb is None)
+                    item = ()
+                elif chunksize is None:
+                    item = (item,)
+                for r in item:
+                    if flatten:
+                        for data in r:
+                            await out.put(data)
+                    else:
+                        await out.put(r)
+                in_flight.release(token)
             if close:
                 out.close()
+                if error_out is not None:
+                    error_out.close()
 
         self.loop.create_task(pipe_in_worker())
         self.loop.create_task(order_out_worker())
@@ -635,7 +971,8 @@ class Chan:
 
     def parallel_pipe_unordered(self, n, f, out=None, buffer=None, buffer_size=None, close=True, flatten=False,
                                 mode='process', mp_module=multiprocessing, pool_args=None,
-                                pool_kwargs=None, error_cb=None, pool_buffer=None):
+                                pool_kwargs=None, error_cb=None, pool_buffer=None, pool=None, chunksize=None,
+                                register=False, transport='pipe', error_out=None, retries=0, backoff=0.1):
 
         """
         Apply the plain function `f` to each value in the channel, and pipe the results to `out`.
@@ -648,7 +985,9 @@ class Chan:
 
         If `f` involves no blocking or slow operation, consider using `async_pipe`.
 
-        :param n: the parallelism of the pool executor (number of threads or number of processes).
+        :param n: the parallelism of the pool executor (number of threads or number of processes). Can also be an
+                  :class:`aiochan.channel.AdaptiveLimit`, in which case the pool has `max_limit` workers but the
+                  number of jobs in flight adapts to their latency, and `pool_buffer` is ignored.
         :param f: a plain function accepting one input value and returning one output value. Should never return `None`.
         :param out: the output channel. if `None`, one without buffer will be created and used.
         :param buffer: buffer of the internal channel, only applies if out is `None`
@@ -661,62 +1000,253 @@ class Chan:
                           (for example, `torch.multiprocessing` from pytorch).
         :param pool_args: additional arguments when creating pool
         :param pool_kwargs: additional keyword arguments when creating pool
-        :param error_cb: callback in case there is an error
+        :param error_cb: if given, called on the loop with the exception of every job that fails after all retries.
         :param pool_buffer: the number of jobs that can be over-committed to the pool
+        :param pool: a :class:`aiochan.channel.WorkerPool` to run `f` in. If given, no pool is created and `mode`,
+                     `mp_module`, `pool_args` and `pool_kwargs` are ignored, and `n` only limits how many jobs of this
+                     pipe are in flight at the same time. The pool is not shut down when the pipe completes. If `None`,
+                     a pool private to this pipe is created.
+        :param chunksize: if given, values are sent to the workers in chunks of at most `chunksize` values, which
+                          amortises the cost of sending jobs and results between processes when `f` is cheap. The
+                          chunks are adaptive: a chunk holds the values that are available immediately when it is
+                          formed, so a chunk is only full if the input is faster than the pool. `n` and `pool_buffer`
+                          then count chunks instead of values.
+        :param register: if `True`, `f` is sent to each worker only once, when the pool starts, instead of with
+                         every job. Use this when `f` is expensive to pickle, e.g. a closure over a large table. Only
+                         applies if `pool` is `None`: for a shared pool, pass `f` in the `register` argument of
+                         :class:`aiochan.channel.WorkerPool` instead, after which all pipes using `f` on that pool
+                         benefit.
+        :param transport: how values and results are sent between the loop and worker processes. With `'pipe'`, they
+                          are pickled through the pool's pipes. With `'shm'`, large `bytes`, `bytearray` and `numpy`
+                          arrays (at least 2 MiB) are instead copied into `multiprocessing.shared_memory` blocks,
+                          and only the names of the blocks go through the pipes. In the workers, `f` receives arrays
+                          as views on the shared memory, without copying. Has no effect in `thread` mode. Otherwise
+                          requires Python 3.8 or later: on earlier versions, a `ValueError` is raised.
+        :param error_out: if given, values for which `f` fails (after all retries) are put into this channel as
+                          `(value, exception)` pairs and processing continues. With `chunksize`, a failure fails the
+                          whole chunk, and each of its values is put. If `None` and `error_cb` is `None`, failures are
+                          reported to the exception handler of the loop and the values are dropped. Closed together
+                          with `out`.
+        :param retries: how many times to resubmit a job that raised an exception.
+        :param backoff: the delay in seconds before the first retry, doubled for each subsequent retry of the same
+                        job.
         :return: the output channel.
         """
+        if transport not in ('pipe', 'shm'):
+            raise ValueError("transport must be one of 'pipe', 'shm'")
+
         if out is None:
             out = Chan(buffer, buffer_size)
 
-        if pool_args is None:
-            pool_args = ()
-
-        if pool_kwargs is None:
-            pool_kwargs = {}
-
-        if error_cb is None:
-            def error_cb(err):
-                def reraise():
-                    raise err
-
-                self.loop.call_soon_threadsafe(reraise)
-
         if pool_buffer is None:
             if flatten:
                 pool_buffer = 0
             else:
                 pool_buffer = 1
 
-        if mode == 'thread':
-            Pool = multiprocessing.dummy.Pool
+        if isinstance(n, AdaptiveLimit):
+            in_flight, n = n, n.max_limit
         else:
-            Pool = mp_module.Pool
-        pool = Pool(n, *pool_args, **pool_kwargs)
+            in_flight = _FixedLimit(n + pool_buffer, self.loop)
 
-        in_flight = asyncio.Semaphore(n + pool_buffer, loop=self.loop)
+        use_shm = transport == 'shm' and (mode if pool is None else pool._mode) != 'thread'
+        if use_shm and not _worker.shm_available():
+            raise ValueError("transport='shm' requires multiprocessing.shared_memory, available from Python 3.8")
 
-        def complete_callback(r):
+        own_pool = pool is None
+        if own_pool:
+            pool = WorkerPool(n, mode, mp_module=mp_module, pool_args=pool_args, pool_kwargs=pool_kwargs,
+                              register=(f,) if register else ())
+
+        def complete_callback(r, token):
             if flatten:
                 for item in r[:-1]:
                     out.put_nowait(item, immediate_only=False)
-                out.put_nowait(r[-1], immediate_only=False, cb=lambda _: in_flight.release())
+                out.put_nowait(r[-1], immediate_only=False, cb=lambda _: in_flight.release(token))
+            else:
+                out.put_nowait(r, immediate_only=False, cb=lambda _: in_flight.release(token))
+
+        async def put_chunk(rs, token):
+            # a whole chunk could overflow the pending puts of `out` if put with `put_nowait`
+            if flatten:
+                rs = [item for r in rs for item in r]
+            await out.put_many(rs)
+            in_flight.release(token)
+
+        async def fail(data, err, token):
+            if error_cb is not None:
+                error_cb(err)
+            await self._pipe_failed(error_out, data if chunksize is not None else (data,), err,
+                                    report=error_cb is None)
+            in_flight.release(token)
+
+        func = pool._job(f, chunksize is not None)
+        # completions from the pool are handed to the loop in batches
+        completions = ThreadsafeCalls(self.loop)
+
+        def submit(data, token, attempt):
+            def on_done(r):
+                if chunksize is None:
+                    completions.call(complete_callback, r, token)
+                else:
+                    completions.call(self.loop.create_task, put_chunk(r, token))
+
+            pool._submit(func, data, chunksize is not None, use_shm, on_done,
+                         lambda err: completions.call(retry_or_fail, data, token, attempt, err))
+
+        def retry_or_fail(data, token, attempt, err):
+            # the slot of the job stays taken while it is retried
+            if attempt < retries:
+                self.loop.call_later(backoff * 2 ** attempt, submit, data, token, attempt + 1)
             else:
-                out.put_nowait(r, immediate_only=False, cb=lambda _: in_flight.release())
+                self.loop.create_task(fail(data, err, token))
 
         async def pipe_in_worker():
-            async for data in self:
-                await in_flight.acquire()
-                pool.apply_async(f, (data,), callback=lambda r: self.loop.call_soon_threadsafe(complete_callback, r),
-                                 error_callback=error_cb)
+            while True:
+                if chunksize is None:
+                    data = await self.get()
+                else:
+                    data = (await self.get_many(chunksize)) or None
+                if data is None:
+                    break
+                token = await in_flight.acquire()
+                submit(data, token, 0)
+
+            # jobs being retried still need the pool
+            await in_flight.idle()
+            if own_pool:
+                pool.close()
+            if close:
+                out.close()
+                if error_out is not None:
+                    error_out.close()
+
+        self.loop.create_task(pipe_in_worker())
+
+        return out
+
+    def actor_pipe(self, n, actor, out=None, buffer=None, buffer_size=None, close=True, flatten=False, *, args=(),
+                   kwargs=None, key=None, mode='process', mp_module=multiprocessing, pool_buffer=2, error_out=None,
+                   retries=0, backoff=0.1):
+        """
+        Process the values in the channel with `n` stateful workers, and pipe the results to `out` in the order of
+        their inputs.
+
+        Each worker constructs its own actor by calling `actor(*args, **kwargs)` and calls its `setup` method once,
+        before processing its first value. The actor then processes all the values routed to its worker with its
+        `process` method, and its `teardown` method is called when the input channel is closed and all values have
+        been processed. Use this instead of :meth:`aiochan.channel.Chan.parallel_pipe` when processing needs an
+        expensive resource, e.g. a model loaded into memory or a connection, that should be created once per worker and
+        kept warm::
+
+            class Model(Actor):
+                def __init__(self, path):
+                    self.path = path
+
+                def setup(self):
+                    self.model = load_model(self.path)
+
+                def process(self, value):
+                    return self.model.predict(value)
 
-            pool.close()
+            out = c.actor_pipe(4, Model, args=('model.bin',))
 
+        :param n: the number of workers, each running one actor in its own thread or process.
+        :param actor: a subclass of :class:`aiochan.channel.Actor`, or any callable returning an object with the same
+                      methods. In `process` mode, it and `args` and `kwargs` must be picklable.
+        :param out: the output channel. if `None`, one without buffer will be created and used.
+        :param buffer: buffer of the internal channel, only applies if out is `None`
+        :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
+        :param close: whether to close the output channel when the input channel is closed.
+        :param flatten: if `True`, assume `process` returns sequence and puts individual elements of the sequence
+               onto the output channel instead
+        :param args: positional arguments for constructing the actors.
+        :param kwargs: keyword arguments for constructing the actors.
+        :param key: if given, values `v` with equal `key(v)` are always routed to the same worker, so that the state an
+                    actor keeps about a key stays in one place. Otherwise each value goes to the least busy worker.
+        :param mode: if `thread`, each actor runs in a thread; if `process`, each actor runs in a process.
+        :param mp_module: when `mode='process'`, you can optionally pass in a compatible multiprocessing module
+                          (for example, `torch.multiprocessing` from pytorch).
+        :param pool_buffer: the number of values that can be over-committed to each worker.
+        :param error_out: if given, values for which `process` fails (after all retries) are put into this channel as
+                          `(value, exception)` pairs and processing continues. If `None`, failures are reported to the
+                          exception handler of the loop and the values are dropped. A failure in constructing or
+                          setting up an actor fails the value that triggered it, and is retried with the next value.
+                          Closed together with `out`.
+        :param retries: how many times to resubmit a value for which `process` raised an exception, to the same worker.
+        :param backoff: the delay in seconds before the first retry, doubled for each subsequent retry of the same
+                        value.
+        :return: the output channel.
+        """
+        if out is None:
+            out = Chan(buffer, buffer_size)
+
+        pools = [WorkerPool(1, mode, mp_module=mp_module,
+                            pool_kwargs={'initializer': _worker.init_actor, 'initargs': (actor, args, kwargs or {})})
+                 for _ in range(n)]
+        slots = [_FixedLimit(1 + pool_buffer, self.loop) for _ in range(n)]
+        loads = [0] * n
+        results_chan = Chan(n * (1 + pool_buffer), loop=self.loop)
+        completions = ThreadsafeCalls(self.loop)
+
+        def submit(i, v, ft, attempt):
+            pools[i]._submit(_worker.call_actor, v, False, False,
+                             lambda r: completions.call(ft.set_result, r),
+                             lambda err: completions.call(retry_or_fail, i, v, ft, attempt, err))
+
+        def retry_or_fail(i, v, ft, attempt, err):
+            if attempt < retries:
+                self.loop.call_later(backoff * 2 ** attempt, submit, i, v, ft, attempt + 1)
+            else:
+                ft.set_result(_Failed((v,), err))
+
+        async def pipe_in_worker():
+            async for v in self:
+                if key is None:
+                    i = loads.index(min(loads))
+                else:
+                    i = hash(key(v)) % n
+                await slots[i].acquire()
+                loads[i] += 1
+                ft = self.loop.create_future()
+                submit(i, v, ft, 0)
+                await results_chan.put((ft, i))
+            results_chan.close()
+
+        async def order_out_worker():
+            async for ft, i in results_chan:
+                r = await ft
+                if isinstance(r, _Failed):
+                    await self._pipe_failed(error_out, r.values, r.exc)
+                elif flatten:
+                    for item in r:
+                        await out.put(item)
+                else:
+                    await out.put(r)
+                loads[i] -= 1
+                slots[i].release()
+
+            # a pool runs its jobs in order, so the teardown job of each actor runs after all its values
+            torn_down = []
+            for pool in pools:
+                ft = self.loop.create_future()
+                pool.apply_async(_worker.teardown_actor,
+                                 callback=lambda _, ft=ft: completions.call(ft.set_result, None),
+                                 error_callback=lambda err, ft=ft: completions.call(ft.set_result, err))
+                pool.close()
+                torn_down.append(ft)
+            for ft in torn_down:
+                err = await ft
+                if err is not None:
+                    self.loop.call_exception_handler({'message': 'Exception in teardown of actor ' + repr(actor),
+                                                      'exception': err})
             if close:
-                for i in range(n + pool_buffer):
-                    await in_flight.acquire()
                 out.close()
+                if error_out is not None:
+                    error_out.close()
 
         self.loop.create_task(pipe_in_worker())
+        self.loop.create_task(order_out_worker())
 
         return out
 
@@ -839,6 +1369,50 @@ class Chan:
 
         return self.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
 
+    def map_batched(self, f, max_batch, max_wait=None, *, out=None, buffer=None, buffer_size=None, close=True,
+                    parallelism=None, mode='thread', pool=None):
+        """
+        Returns a channel containing `f` applied to batches of values from the channel, with the results scattered
+        back into individual values in the order of their inputs. Use this for functions that are much cheaper per value
+        when applied to many values at once, e.g. `numpy` ufuncs or bulk lookups in a database::
+
+            out = c.map_batched(lambda vs: numpy.sqrt(numpy.asarray(vs)), 256, 0.005)
+
+        :param f: a function receiving a list of values and returning a sequence with one result for each of them, in
+                  the same order. The results cannot be `None`.
+        :param max_batch: the maximum number of values in a batch.
+        :param max_wait: if not `None`, a partial batch is processed `max_wait` seconds after its first value arrived,
+                         as in :meth:`aiochan.channel.Chan.group_within`. If `None`, batches are only cut short when
+                         the channel is closed, as in :meth:`aiochan.channel.Chan.group`.
+        :param out: the output channel. If `None`, one with no buffering will be created.
+        :param buffer: buffer of the internal channel, only applies if out is `None`
+        :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
+        :param close: whether `out` should be closed when there are no more values to be produced.
+        :param parallelism: if `None`, `f` is called on the loop. Otherwise `f` is called in a pool with this many
+                            workers, as in :meth:`aiochan.channel.Chan.parallel_pipe`, so that several batches are
+                            processed at the same time.
+        :param mode: `thread` or `process`, the kind of pool to use when `parallelism` is given.
+        :param pool: a :class:`aiochan.channel.WorkerPool` to use when `parallelism` is given, instead of creating one.
+        :return: the output channel.
+        """
+        if max_wait is None:
+            batches = self.group(max_batch)
+        else:
+            batches = self.group_within(max_batch, max_wait)
+
+        if parallelism is not None:
+            return batches.parallel_pipe(parallelism, f, out, buffer, buffer_size, close=close, flatten=True, mode=mode,
+                                         pool=pool)
+
+        async def worker(inp, o):
+            async for batch in inp:
+                if not await o.put_many(f(batch)):
+                    break
+            if close:
+                o.close()
+
+        return batches.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
+
     def filter(self, p, *, out=None, buffer=None, buffer_size=None, close=True):
         """
         Returns a channel containing values `v` from the channel for which `p(v)` is true.
@@ -987,6 +1561,162 @@ class Chan:
 
         return self.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
 
+    def group_within(self, max_n, max_wait, out=None, buffer=None, buffer_size=None, close=True):
+        """
+        Returns a channel containing the elements of the source channel grouped into batches, where a batch is emitted
+        as soon as it holds `max_n` elements, or `max_wait` seconds after its first element arrived, whichever comes
+        first. Unlike :meth:`aiochan.channel.Chan.group`, this bounds the latency added by batching when the source
+        is slow.
+
+        :param max_n: the maximum size of a batch
+        :param max_wait: the maximum number of seconds, measured by the clock of the loop, that the first element of a
+                         batch waits for the batch to be emitted. This does not include the time waiting for `out` to
+                         accept the batch.
+        :param out: the output channel. If `None`, one with no buffering will be created.
+        :param buffer: buffer of the internal channel, only applies if out is `None`
+        :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
+        :param close: whether `out` should be closed when there are no more values to be produced.
+        :return: the output channel.
+        """
+
+        async def worker(inp, o):
+            batched = []
+            deadline = None
+            while True:
+                if not batched:
+                    v = await inp.get()
+                    if v is None:
+                        break
+                    deadline = self.loop.time() + max_wait
+                else:
+                    v = await inp.get(timeout=max(0, deadline - self.loop.time()))
+                if v is not None:
+                    batched.append(v)
+                # `None` is a timeout, or the source being closed, which the next `get` of an empty batch finds out
+                if batched and (v is None or len(batched) == max_n):
+                    if not await o.put(batched):
+                        break
+                    batched = []
+            if close:
+                o.close()
+
+        return self.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
+
+    def throttle(self, rate, burst=1, out=None, buffer=None, buffer_size=None, close=True, *, drop=False):
+        """
+        Returns a channel containing the values of the channel at a rate of at most `rate` values per second, with
+        bursts of at most `burst` values, using a token bucket driven by the clock of the loop.
+
+        :param rate: the sustained number of values per second.
+        :param burst: the maximum number of values that can be passed at once after a quiet period.
+        :param out: the output channel. If `None`, one with no buffering will be created.
+        :param buffer: buffer of the internal channel, only applies if out is `None`
+        :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
+        :param close: whether `out` should be closed when there are no more values to be produced.
+        :param drop: if `False`, values in excess of the rate are delayed, which in turn slows down the puts into the
+                     channel. If `True`, they are dropped instead.
+        :return: the output channel.
+        """
+
+        async def worker(inp, o):
+            tokens = burst
+            last = self.loop.time()
+            async for v in inp:
+                now = self.loop.time()
+                tokens = min(burst, tokens + (now - last) * rate)
+                last = now
+                if tokens < 1:
+                    if drop:
+                        continue
+                    await asyncio.sleep((1 - tokens) / rate)
+                    now = self.loop.time()
+                    tokens += (now - last) * rate
+                    last = now
+                tokens -= 1
+                if not await o.put(v):
+                    break
+            if close:
+                o.close()
+
+        return self.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
+
+    def debounce(self, quiet_period, out=None, buffer=None, buffer_size=None, close=True):
+        """
+        Returns a channel containing the values of the channel that are not followed by another value within
+        `quiet_period` seconds: of a burst of values arriving in quick succession, only the last one is produced, once
+        the burst is over. The last value before the channel is closed is always produced.
+
+        :param quiet_period: how many seconds without a new value a value has to wait before being produced.
+        :param out: the output channel. If `None`, one with no buffering will be created.
+        :param buffer: buffer of the internal channel, only applies if out is `None`
+        :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
+        :param close: whether `out` should be closed when there are no more values to be produced.
+        :return: the output channel.
+        """
+
+        async def worker(inp, o):
+            while True:
+                v = await inp.get()
+                if v is None:
+                    break
+                # a timer is only armed for gets that cannot complete immediately
+                while True:
+                    nv = await inp.get(timeout=quiet_period)
+                    if nv is None:
+                        break
+                    v = nv
+                if not await o.put(v):
+                    break
+            if close:
+                o.close()
+
+        return self.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
+
+    def sample(self, interval, out=None, buffer=None, buffer_size=None, close=True):
+        """
+        Returns a channel containing, every `interval` seconds, the latest value of the channel if a new value arrived
+        during the interval. Values superseded within an interval are dropped. The latest value before the channel is
+        closed is always produced.
+
+        :param interval: the sampling period, in seconds, measured by the clock of the loop.
+        :param out: the output channel. If `None`, one with no buffering will be created.
+        :param buffer: buffer of the internal channel, only applies if out is `None`
+        :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
+        :param close: whether `out` should be closed when there are no more values to be produced.
+        :return: the output channel.
+        """
+
+        async def worker(inp, o):
+            latest = None
+            next_tick = self.loop.time() + interval
+            while True:
+                v = await inp.get(timeout=max(0, next_tick - self.loop.time()))
+                ended = False
+                if v is not None:
+                    latest = v
+                    # a source that always has a value ready never times out, so the clock is checked on every value
+                    if self.loop.time() < next_tick:
+                        continue
+                elif inp.closed:
+                    async for v in inp:
+                        latest = v
+                    ended = True
+                # otherwise, `None` is the end of an interval
+                if latest is not None:
+                    if not await o.put(latest):
+                        break
+                    latest = None
+                if ended:
+                    break
+                next_tick += interval
+                now = self.loop.time()
+                if next_tick <= now:
+                    next_tick = now + interval
+            if close:
+                o.close()
+
+        return self.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
+
     def group_by(self, f, out=None, buffer=None, buffer_size=None, close=True):
         """
         Returns a channel containing `(group_key, [elements...])` where `group_key` is the result of `f` applied to
@@ -1105,6 +1835,15 @@ class Chan:
 
         return self.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
 
+    def pipeline(self):
+        """
+        Create a :class:`aiochan.channel.Pipeline` from the channel, for fusing chains of synchronous transformations
+        into a single coroutine.
+
+        :return: the pipeline
+        """
+        return Pipeline(self)
+
     def dup(self):
         """
         Create a :meth:`aiochan.channel.Dup` from the channel
@@ -1153,7 +1892,7 @@ class Chan:
         return self
 
 
-def tick_tock(seconds, start_at=None, loop=None):
+def tick_tock(seconds, start_at=None, loop=None, *, resolution=None):
     """
     Returns a channel that gives out values every `seconds`.
 
@@ -1164,10 +1903,13 @@ def tick_tock(seconds, start_at=None, loop=None):
                      (in float).
     :param seconds: time interval of the ticks
     :param loop: you can optionally specify the loop on which the returned channel is intended to be used.
+    :param resolution: if not `None`, the ticks are scheduled on the :func:`aiochan.timers.shared_wheel` with this
+                       resolution instead of individually on the loop, and may be up to `resolution` seconds late.
     :return: the tick channel
     """
     loop = loop or asyncio.get_event_loop()
     c = Chan(loop=loop)
+    call_at = loop.call_at if resolution is None else timers.shared_wheel(resolution, loop=loop).call_at
 
     start_time = (start_at or loop.time()) + seconds
 
@@ -1177,9 +1919,9 @@ def tick_tock(seconds, start_at=None, loop=None):
         nonlocal ct
         ct += 1
         if c.put_nowait((ct, loop.time()), immediate_only=False) is not False:
-            loop.call_at(start_time + seconds * ct, tick)
+            call_at(start_time + seconds * ct, tick)
 
-    loop.call_at(start_time, tick)
+    call_at(start_time, tick)
 
     return c
 
@@ -1202,17 +1944,26 @@ class ChanIterator:
         return ret
 
 
-def timeout(seconds, loop=None):
+def timeout(seconds, loop=None, *, resolution=None):
     """
     Returns a channel that closes itself after `seconds`.
 
+    To bound the waiting time of a single operation, it is cheaper to pass `timeout` to
+    :meth:`aiochan.channel.Chan.get`, :meth:`aiochan.channel.Chan.put` or :meth:`aiochan.channel.select` instead.
+
     :param seconds: time before the channel is closed
     :param loop: you can optionally specify the loop on which the returned channel is intended to be used.
+    :param resolution: if not `None`, the deadline is armed on the :func:`aiochan.timers.shared_wheel` with this
+                       resolution instead of individually on the loop, and the channel may close up to `resolution`
+                       seconds late. Use this when very many timeouts are in flight at the same time.
     :return: the timeout channel
     """
     c = Chan(loop=loop or asyncio.get_event_loop())
 
-    c.loop.call_later(seconds, c.close)
+    if resolution is None:
+        c.loop.call_later(seconds, c.close)
+    else:
+        timers.shared_wheel(resolution, loop=c.loop).call_later(seconds, c.close)
 
     return c
 
@@ -1259,9 +2010,15 @@ def from_range(start=None, end=None, step=None, *, loop=None):
     return from_iter(range(start, end, step), loop=loop)
 
 
+def _as_chan(c):
+    # a pipeline passed where a channel is expected stands for its materialised channel
+    return c.chan() if isinstance(c, Pipeline) else c
+
+
 def select(*chan_ops,
            priority=False,
            default=None,
+           timeout=None,
            cb=None,
            loop=None):
     """
@@ -1272,36 +2029,44 @@ def select(*chan_ops,
     :param priority: if True, the operations will be tried serially, else the order is random
     :param default: if not None, do not queue the operations if they cannot be completed immediately, instead return
            a future containing SelectResult(val=default, chan=None).
+    :param timeout: if not None, the maximum number of seconds to wait. If no operation completes in time, all
+           operations are withdrawn and the result is SelectResult(val=None, chan=None).
     :param cb:
     :param loop: asyncio loop to run on
     :return: a function containing SelectResult(val=result, chan=succeeded_chan)
     """
     chan_ops = list(chan_ops)
-    if not cb:
+    if not cb or timeout is not None:
         loop = loop or asyncio.get_event_loop()
+    if not cb:
         ft = loop.create_future()
     flag = SelectFlag()
     if not priority:
         random.shuffle(chan_ops)
     ret = None
+    handle = None
 
     if not cb:
         def set_result_wrap(c):
             def set_result(v):
+                if handle is not None:
+                    handle.cancel()
                 ft.set_result((v, c))
 
             return set_result
     else:
         def set_result_wrap(c):
             def set_result(v):
+                if handle is not None:
+                    handle.cancel()
                 cb(v, c)
 
             return set_result
 
     for chan_op in chan_ops:
-        if isinstance(chan_op, Chan):
+        if isinstance(chan_op, (Chan, Pipeline)):
             # getting
-            chan = chan_op
+            chan = _as_chan(chan_op)
             r = chan._get(SelectHandler(set_result_wrap(chan), flag))
             if r is not None:
                 ret = (r[0], chan)
@@ -1309,11 +2074,24 @@ def select(*chan_ops,
         else:
             # putting
             chan, val = chan_op
+            chan = _as_chan(chan)
             # noinspection PyProtectedMember
             r = chan._put(val, SelectHandler(set_result_wrap(chan), flag))
             if r is not None:
                 ret = (r[0], chan)
                 break
+
+    if not ret and default is None and timeout is not None and flag.active:
+        def timed_out():
+            if flag.active:
+                flag.commit(None)
+                if cb:
+                    cb(None, None)
+                else:
+                    ft.set_result((None, None))
+
+        handle = loop.call_later(timeout, timed_out)
+
     if cb:
         if ret:
             cb(ret[0], ret[1])
@@ -1331,6 +2109,211 @@ def select(*chan_ops,
     return ft
 
 
+class Selector:
+    """
+    A reusable selection over a fixed set of operations. Equivalent to calling :meth:`aiochan.channel.select` with
+    the same `chan_ops` repeatedly, but the handlers are allocated once and re-armed for every round, and fairness is
+    achieved by rotating the starting operation instead of shuffling all operations.
+
+    A selector must not be used concurrently: do not call :meth:`aiochan.channel.Selector.select` again before the
+    awaitable returned by the previous call completes (or is cancelled).
+
+    In `indexed` mode, which only supports get operations, the selector does not register handlers on the channels at
+    all. Instead, each channel notifies the selector whenever it becomes ready for taking, and the selector keeps
+    a first-in-first-out set of ready channels. A round of selection then costs time proportional to the number of
+    ready channels instead of the total number of channels, which makes this mode suitable for very wide fan-in.
+    Channels can be added and removed with :meth:`aiochan.channel.Selector.add` and
+    :meth:`aiochan.channel.Selector.remove`. Note that with no pending getter registered, unbuffered puts to the
+    channels are queued and only complete when the selector takes their values.
+
+    :param chan_ops: operations, each is either a channel in which a get operation is attempted, or a tuple
+           (chan, val) in which a put operation of the fixed value `val` is attempted.
+    :param priority: if True, the operations will always be tried in the given order, else the starting operation is
+           rotated on each round. Has no effect in `indexed` mode.
+    :param indexed: whether to use readiness notifications instead of probing all channels on each round.
+    :param loop: asyncio loop to run on
+    """
+
+    def __init__(self, *chan_ops, priority=False, indexed=False, loop=None):
+        assert chan_ops or indexed, 'Selector requires at least one operation'
+        self._loop = loop or asyncio.get_event_loop()
+        self._priority = priority
+        self._indexed = indexed
+        self._ft = None
+        self._undelivered = None
+        if indexed:
+            self._chans = set()
+            self._ready = collections.OrderedDict()
+            self._waking = False
+            for chan in chan_ops:
+                self._check_get_op(chan)
+            for chan in chan_ops:
+                self.add(chan)
+            return
+        self._flag = ReusableSelectFlag()
+        self._flag.active = False
+        self._ops = []
+        for chan_op in chan_ops:
+            if isinstance(chan_op, (Chan, Pipeline)):
+                chan, val = chan_op, None
+            else:
+                chan, val = chan_op
+            chan = _as_chan(chan)
+            handler = SelectHandler(functools.partial(self._deliver, chan), self._flag)
+            self._ops.append((handler, chan, val))
+        self._start = 0
+
+    def _deliver(self, chan, v):
+        ft = self._ft
+        if ft.done():
+            # an op completed after its round was cancelled but before it was withdrawn: the value has already been
+            # taken from (or given to) the channel, so it is kept for the next round instead of being lost
+            self._undelivered = (v, chan)
+        else:
+            ft.set_result((v, chan))
+
+    def _withdraw(self, ft):
+        if ft.cancelled() and ft is self._ft and self._flag.active:
+            self._flag.commit(None)
+
+    def _on_ready(self, chan):
+        self._ready[chan] = None
+        ft = self._ft
+        if ft is not None and not ft.done() and not self._waking:
+            # called from inside channel operations, so the actual take is deferred to avoid reentrancy
+            self._waking = True
+            self._loop.call_soon(self._wake)
+
+    def _wake(self):
+        self._waking = False
+        ft = self._ft
+        if not ft.done():
+            r = self._take_ready()
+            if r is not None:
+                ft.set_result(r)
+
+    def _take_ready(self):
+        ready = self._ready
+        while ready:
+            chan, _ = ready.popitem(last=False)
+            # noinspection PyProtectedMember
+            r = chan._get(_IMMEDIATE)
+            if r is not None or chan.closed:
+                # noinspection PyProtectedMember
+                if chan._takeable():
+                    ready[chan] = None
+                return r[0] if r is not None else None, chan
+        return None
+
+    @staticmethod
+    def _check_get_op(chan_op):
+        if not isinstance(chan_op, (Chan, Pipeline)):
+            raise TypeError('indexed selectors only support get operations, got ' + repr(chan_op))
+
+    def add(self, chan):
+        """
+        Add a channel to an `indexed` selector.
+
+        :param chan: the channel to add
+        :return: `self`
+        """
+        assert self._indexed, 'only indexed selectors support adding channels'
+        self._check_get_op(chan)
+        chan = _as_chan(chan)
+        if chan not in self._chans:
+            self._chans.add(chan)
+            # noinspection PyProtectedMember
+            chan._watch(self._on_ready)
+            self._ready[chan] = None
+        return self
+
+    def remove(self, chan):
+        """
+        Remove a channel from an `indexed` selector.
+
+        :param chan: the channel to remove
+        :return: `self`
+        """
+        assert self._indexed, 'only indexed selectors support removing channels'
+        chan = _as_chan(chan)
+        if chan in self._chans:
+            self._chans.remove(chan)
+            # noinspection PyProtectedMember
+            chan._unwatch(self._on_ready)
+            self._ready.pop(chan, None)
+        return self
+
+    def close(self):
+        """
+        Detach an `indexed` selector from all its channels.
+
+        :return: `self`
+        """
+        if self._indexed:
+            for chan in list(self._chans):
+                self.remove(chan)
+        return self
+
+    def _select_indexed(self, default):
+        if self._ft is not None and not self._ft.done():
+            raise RuntimeError('Selector.select() called while the previous selection is still pending')
+        r = self._take_ready()
+        if r is not None:
+            return Completed(r)
+
+        if default is not None:
+            return Completed((default, None))
+
+        self._ft = self._loop.create_future()
+        return self._ft
+
+    def select(self, default=None):
+        """
+        Asynchronously completes at most one of the registered operations.
+
+        :param default: if not None, do not queue the operations if they cannot be completed immediately, instead
+               return an awaitable containing `(default, None)`.
+        :return: an awaitable containing `(result, succeeded_chan)`
+        """
+        if self._indexed:
+            return self._select_indexed(default)
+
+        if self._undelivered is not None:
+            r, self._undelivered = self._undelivered, None
+            return Completed(r)
+
+        flag = self._flag
+        if flag.active:
+            if self._ft is not None and not self._ft.done():
+                raise RuntimeError('Selector.select() called while the previous selection is still pending')
+            # the previous selection was cancelled by its awaiter: withdraw its pending operations
+            flag.commit(None)
+        flag.reset()
+
+        ops = self._ops
+        n = len(ops)
+        start = self._start
+        if not self._priority:
+            self._start = start + 1 if start + 1 < n else 0
+
+        for i in range(n):
+            handler, chan, val = ops[(start + i) % n]
+            # noinspection PyProtectedMember
+            r = chan._get(handler) if val is None else chan._put(val, handler)
+            if r is not None:
+                if flag.active:
+                    flag.commit(handler)
+                return Completed((r[0], chan))
+
+        if default is not None:
+            flag.commit(None)
+            return Completed((default, None))
+
+        self._ft = self._loop.create_future()
+        self._ft.add_done_callback(self._withdraw)
+        return self._ft
+
+
 def merge(*inputs, out=None, buffer=None, buffer_size=None, close=True):
     """
     Merge the elements of the input channels into a single channel containing the individual values from the inputs.
@@ -1343,19 +2326,25 @@ def merge(*inputs, out=None, buffer=None, buffer_size=None, close=True):
     :return: the ouput channel
     """
     out = out or Chan(buffer, buffer_size)
-
-    async def worker(chs):
-        while chs:
-            v, c = await select(*chs)
+    inputs = {_as_chan(c) for c in inputs}
+    # an indexed selector only looks at inputs that have values ready, so the cost per value does not grow with the
+    # number of inputs
+    sel = Selector(*inputs, indexed=True, loop=out.loop)
+
+    async def worker(n_open):
+        while n_open:
+            v, c = await sel.select()
             if v is None:
-                chs.remove(c)
+                sel.remove(c)
+                n_open -= 1
             else:
                 if not await out.put(v):
                     break
+        sel.close()
         if close:
             out.close()
 
-    out.loop.create_task(worker(set(inputs)))
+    out.loop.create_task(worker(len(inputs)))
     return out
 
 
@@ -1430,6 +2419,494 @@ def combine_latest(*inputs, out=None, buffer=None, buffer_size=None, close=True)
     return out
 
 
+class WorkerPool:
+    """
+    A pool of worker threads or processes that can be created once and shared by any number of
+    :meth:`aiochan.channel.Chan.parallel_pipe` and :meth:`aiochan.channel.Chan.parallel_pipe_unordered` calls, by
+    passing it as `pool`. The workers stay warm between pipes, and jobs from all pipes are scheduled on the same
+    queue.
+
+    The pool must be shut down explicitly with :meth:`aiochan.channel.WorkerPool.close` or
+    :meth:`aiochan.channel.WorkerPool.terminate`, or by using it as a context manager.
+
+    :param n: the number of threads or processes.
+    :param mode: if `thread`, a thread pool will be used; if `process`, a process pool will be used.
+    :param mp_module: when `mode='process'`, you can optionally pass in a compatible multiprocessing module
+                      (for example, `torch.multiprocessing` from pytorch).
+    :param pool_args: additional arguments when creating pool
+    :param pool_kwargs: additional keyword arguments when creating pool
+    :param register: functions to send to every worker once, when the worker starts. Jobs of pipes using one of these
+                     functions then only carry the values, instead of pickling the function for every job, which
+                     matters when the function is a closure over large data. An `initializer` given in `pool_args` or
+                     `pool_kwargs` is still called after registration. Ignored in `thread` mode, where functions are
+                     never pickled.
+    """
+
+    def __init__(self, n, mode='process', *, mp_module=multiprocessing, pool_args=None, pool_kwargs=None,
+                 register=()):
+        if mode == 'thread':
+            Pool = multiprocessing.dummy.Pool
+        else:
+            Pool = mp_module.Pool
+            _worker.ensure_tracker()
+        self._n = n
+        self._mode = mode
+        # thread workers share this process, so there is nothing to gain from registering functions in them, and the
+        # registry of `_worker` would keep the functions alive after the pool is gone
+        self._registered = {id(f): f for f in register} if mode != 'thread' else {}
+        pool_args = pool_args or ()
+        pool_kwargs = dict(pool_kwargs or {})
+        if self._registered:
+            pool_kwargs.update(zip(('initializer', 'initargs', 'maxtasksperchild', 'context'), pool_args))
+            pool_args = ()
+            pool_kwargs['initargs'] = (self._registered, pool_kwargs.get('initializer'),
+                                       tuple(pool_kwargs.get('initargs', ())))
+            pool_kwargs['initializer'] = _worker.init_registered
+        self._pool = Pool(n, *pool_args, **pool_kwargs)
+        self._closed = False
+
+    @property
+    def n(self):
+        """
+        :return: the number of threads or processes in the pool.
+        """
+        return self._n
+
+    @property
+    def closed(self):
+        """
+        :return: whether the pool has been shut down.
+        """
+        return self._closed
+
+    def apply_async(self, f, args=(), kwargs=None, callback=None, error_callback=None):
+        """
+        Schedule `f(*args, **kwargs)` on the pool, with the same meaning as `multiprocessing.pool.Pool.apply_async`.
+        """
+        return self._pool.apply_async(f, args, kwargs or {}, callback=callback, error_callback=error_callback)
+
+    def _submit(self, func, data, chunked, shm, callback, error_callback):
+        # schedule `func(data)`, moving large buffers through shared memory if `shm`. The callbacks are called in the
+        # result handling thread of the pool.
+        if not shm:
+            return self._pool.apply_async(func, (data,), callback=callback, error_callback=error_callback)
+
+        payload = _worker.encode_payload(data, chunked)
+
+        def done(r):
+            _worker.release_payload(payload, chunked)
+            callback(_worker.decode_result(r, chunked))
+
+        def failed(err):
+            _worker.release_payload(payload, chunked)
+            error_callback(err)
+
+        return self._pool.apply_async(functools.partial(_worker.call_shm, func, chunked), (payload,),
+                                      callback=done, error_callback=failed)
+
+    def _job(self, f, chunked):
+        # the function to submit for applying `f` to a value, or to a chunk of values
+        key = id(f)
+        if self._registered.get(key) is f:
+            return functools.partial(_worker.apply_chunk_registered if chunked else _worker.call_registered, key)
+        return functools.partial(_worker.apply_chunk, f) if chunked else f
+
+    def close(self, wait=False):
+        """
+        Shut down the pool after all jobs already scheduled have completed. No new jobs can be scheduled.
+
+        :param wait: if `True`, block until all workers have exited. Note that this blocks the event loop.
+        :return: `None`
+        """
+        if not self._closed:
+            self._closed = True
+            self._pool.close()
+        if wait:
+            self._pool.join()
+
+    def terminate(self):
+        """
+        Stop the workers immediately, without completing outstanding jobs.
+
+        :return: `None`
+        """
+        self._closed = True
+        self._pool.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(wait=True)
+
+    def __repr__(self):
+        return 'WorkerPool<' + str(self._n) + (' closed' if self._closed else '') + '>'
+
+
+class Actor:
+    """
+    Base class for the stateful workers of :meth:`aiochan.channel.Chan.actor_pipe`. Subclasses implement
+    :meth:`aiochan.channel.Actor.process`, and optionally :meth:`aiochan.channel.Actor.setup` and
+    :meth:`aiochan.channel.Actor.teardown`.
+
+    Actors are constructed in the workers, so the constructor should only store configuration, and expensive resources
+    should be acquired in `setup`.
+    """
+
+    def setup(self):
+        """
+        Called in the worker once, before the first value is processed.
+        """
+        pass
+
+    def process(self, value):
+        """
+        Process one value and return the result. Should never return `None`.
+        """
+        raise NotImplementedError
+
+    def teardown(self):
+        """
+        Called in the worker once, after the last value has been processed.
+        """
+        pass
+
+
+LimitStat = collections.namedtuple('LimitStat', 'limit in_flight waiting min_latency')
+
+
+class AdaptiveLimit:
+    """
+    A concurrency limit that adapts to the observed latency of the jobs it admits, which can be passed as `n` to
+    :meth:`aiochan.channel.Chan.async_pipe`, :meth:`aiochan.channel.Chan.async_pipe_unordered`,
+    :meth:`aiochan.channel.Chan.parallel_pipe` and :meth:`aiochan.channel.Chan.parallel_pipe_unordered` instead of a
+    fixed number.
+
+    The limit is adjusted by additive increase, multiplicative decrease (AIMD): while the latency of jobs stays within
+    `tolerance` times the minimum latency recently observed and there are jobs waiting to be admitted, the limit grows
+    by about one for every `limit` completed jobs. When the latency exceeds that, which means that jobs are queueing
+    somewhere downstream, the limit is multiplied by `backoff`, at most once for every `limit` completed jobs. The
+    minimum latency is re-estimated every `window` jobs, rising by at most 10% each time, so that the limit follows
+    a changing baseline without following congestion.
+
+    For parallel pipes, the latency of a job includes the time taken to put its result into the output channel, so the
+    limit also reacts to a slow consumer.
+
+    :param max_limit: the maximum limit. The pipes start this many coroutines or workers.
+    :param min_limit: the minimum limit.
+    :param initial: the initial limit. If `None`, `min_limit` is used.
+    :param tolerance: the ratio between the latency of a job and the minimum latency above which the limit decreases.
+    :param backoff: the factor applied to the limit when it decreases.
+    :param window: the number of jobs after which the minimum latency is re-estimated.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial=None, *, tolerance=2.0, backoff=0.9, window=100):
+        assert 1 <= min_limit <= max_limit, 'limits must satisfy 1 <= min_limit <= max_limit'
+        self._min = min_limit
+        self._max = max_limit
+        self._limit = float(min(max(initial or min_limit, min_limit), max_limit))
+        self._tolerance = tolerance
+        self._backoff = backoff
+        self._window = window
+        self._in_flight = 0
+        self._waiters = collections.deque()
+        self._idle_waiters = []
+        self._baseline = None
+        self._window_min = None
+        self._samples = 0
+        self._since_decrease = 0
+
+    @property
+    def max_limit(self):
+        return self._max
+
+    @property
+    def min_limit(self):
+        return self._min
+
+    @property
+    def limit(self):
+        """
+        :return: the current limit.
+        """
+        return int(self._limit)
+
+    def stats(self):
+        """
+        Getting the current state of the limit, useful for monitoring.
+
+        :return: a `LimitStat` object `ls`, where `ls.limit` is the current limit, `ls.in_flight` the number of
+                 admitted jobs that have not completed, `ls.waiting` the number of jobs waiting to be admitted and
+                 `ls.min_latency` the minimum latency currently used as the baseline, in seconds.
+        """
+        return LimitStat(limit=int(self._limit), in_flight=self._in_flight, waiting=len(self._waiters),
+                         min_latency=self._baseline)
+
+    async def acquire(self):
+        """
+        **Coroutine**. Wait until a job can be admitted.
+
+        :return: a token that must be passed to :meth:`aiochan.channel.AdaptiveLimit.release` when the job completes.
+        """
+        loop = asyncio.get_event_loop()
+        if self._waiters or self._in_flight >= int(self._limit):
+            ft = loop.create_future()
+            self._waiters.append(ft)
+            # the slot is handed over by `release`
+            try:
+                await ft
+            except asyncio.CancelledError:
+                if ft.done() and not ft.cancelled():
+                    self._in_flight -= 1
+                    self._wake()
+                raise
+        else:
+            self._in_flight += 1
+        return loop.time()
+
+    def release(self, token):
+        """
+        Record the completion of a job admitted by :meth:`aiochan.channel.AdaptiveLimit.acquire` and adjust the limit.
+
+        :param token: the token returned by `acquire`.
+        """
+        latency = asyncio.get_event_loop().time() - token
+        demand = bool(self._waiters) or self._in_flight >= int(self._limit)
+        self._in_flight -= 1
+        self._update(latency, demand)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._in_flight < int(self._limit):
+            ft = self._waiters.popleft()
+            if not ft.done():
+                self._in_flight += 1
+                ft.set_result(None)
+
+        if not self._in_flight and not self._waiters:
+            for ft in self._idle_waiters:
+                if not ft.done():
+                    ft.set_result(None)
+            self._idle_waiters = []
+
+    def _update(self, latency, demand):
+        self._samples += 1
+        if self._window_min is None or latency < self._window_min:
+            self._window_min = latency
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        if self._samples % self._window == 0:
+            # the minimum of a window is measured under the current load, so the baseline only rises slowly,
+            # otherwise it would simply follow congestion upwards
+            self._baseline = min(self._window_min, self._baseline * 1.1)
+            self._window_min = None
+
+        self._since_decrease += 1
+        # latencies below a millisecond are dominated by scheduling noise
+        if latency > self._tolerance * max(self._baseline, 0.001):
+            if self._since_decrease >= self._limit:
+                self._limit = max(self._min, self._limit * self._backoff)
+                self._since_decrease = 0
+        elif demand:
+            self._limit = min(self._max, self._limit + 1 / self._limit)
+
+    async def idle(self):
+        """
+        **Coroutine**. Wait until no job is admitted or waiting.
+        """
+        while self._in_flight or self._waiters:
+            ft = asyncio.get_event_loop().create_future()
+            self._idle_waiters.append(ft)
+            await ft
+
+    def __repr__(self):
+        return 'AdaptiveLimit<' + str(int(self._limit)) + ' of ' + str(self._min) + '..' + str(self._max) + '>'
+
+
+class _FixedLimit:
+    # the fixed counterpart of AdaptiveLimit used by the pipes when `n` is a number
+
+    def __init__(self, n, loop):
+        self._n = n
+        self._sem = asyncio.Semaphore(n, loop=loop)
+
+    async def acquire(self):
+        await self._sem.acquire()
+
+    def release(self, token=None):
+        self._sem.release()
+
+    async def idle(self):
+        for _ in range(self._n):
+            await self._sem.acquire()
+
+
+class Pipeline:
+    """
+    A lazy chain of synchronous transformations of a channel, created by :meth:`aiochan.channel.Chan.pipeline`.
+
+    The transformation methods have the same meaning as the channel methods of the same names, but instead of starting
+    one coroutine and creating one channel per stage, they only record the stage and return a new pipeline. The stages
+    are fused into a single coroutine when the output channel is materialised, either explicitly by
+    :meth:`aiochan.channel.Pipeline.chan`, or implicitly on first use of any other channel method or attribute on the
+    pipeline (e.g. ``async for``, :meth:`aiochan.channel.Chan.get` or :meth:`aiochan.channel.Chan.async_pipe`), which
+    are then delegated to the materialised channel::
+
+        async for v in c.pipeline().map(parse).filter(valid).take(100):
+            ...
+
+    A pipeline is not a :class:`aiochan.channel.Chan`. It can be passed to :func:`aiochan.channel.select`,
+    :class:`aiochan.channel.Selector` and :func:`aiochan.channel.merge`, which then use the materialised channel, and
+    report it instead of the pipeline as the channel an operation completed on. Elsewhere, materialise it with
+    :meth:`aiochan.channel.Pipeline.chan` first.
+
+    :param chan: the source channel.
+    """
+
+    def __init__(self, chan, xforms=()):
+        self._chan = chan
+        self._xforms = tuple(xforms)
+        self._out = None
+
+    def _then(self, *xfs):
+        return Pipeline(self._chan, self._xforms + xfs)
+
+    def map(self, f, *, flatten=False):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.map`.
+
+        :return: the new pipeline.
+        """
+        if flatten:
+            return self._then(xform.map(f), xform.cat())
+        return self._then(xform.map(f))
+
+    def filter(self, p):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.filter`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.filter(p))
+
+    def take(self, n):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.take`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.take(n))
+
+    def drop(self, n):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.drop`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.drop(n))
+
+    def take_while(self, p):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.take_while`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.take_while(p))
+
+    def drop_while(self, p):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.drop_while`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.drop_while(p))
+
+    def group(self, n):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.group`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.group(n))
+
+    def group_by(self, f):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.group_by`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.group_by(f))
+
+    def distinct(self):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.distinct`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.distinct())
+
+    def scan(self, f, init=None):
+        """
+        Add a stage as in :meth:`aiochan.channel.Chan.scan`.
+
+        :return: the new pipeline.
+        """
+        return self._then(xform.scan(f, init))
+
+    def chan(self, *, out=None, buffer=None, buffer_size=None, close=True):
+        """
+        Materialise the pipeline: start a single coroutine applying all stages to the values of the source channel.
+        Calling this method again returns the same channel.
+
+        :param out: the output channel. If `None`, one with no buffering will be created.
+        :param buffer: buffer of the internal channel, only applies if out is `None`
+        :param buffer_size: buffer_size of the internal channel, only applies if out is `None`
+        :param close: whether `out` should be closed when there are no more values to be produced.
+        :return: the output channel.
+        """
+        if self._out is not None:
+            return self._out
+
+        xf = xform.comp(*self._xforms)
+
+        async def worker(inp, o):
+            produced = []
+
+            def sink(v):
+                if v is not None:
+                    produced.append(v)
+                return True
+
+            rf = xf(sink)
+            open_ = True
+            async for v in inp:
+                more = rf(v)
+                if produced:
+                    open_ = await o.put_many(produced)
+                    produced.clear()
+                    if not open_:
+                        break
+                if not more:
+                    break
+            if open_:
+                rf(None)
+                await o.put_many(produced)
+            if close:
+                o.close()
+
+        self._out = self._chan.async_apply(worker, out, buffer=buffer, buffer_size=buffer_size)
+        return self._out
+
+    def __getattr__(self, name):
+        return getattr(self.chan(), name)
+
+    def __aiter__(self):
+        return self.chan().__aiter__()
+
+    def __repr__(self):
+        return 'Pipeline<' + repr(self._chan) + ' stages=' + str(len(self._xforms)) + '>'
+
+
 class Dup:
     """
     A duplicator: takes values from the input, and gives out the same value to all outputs.
@@ -1,12 +1,17 @@
 import asyncio
+import collections
+import operator
 import random
+import sys
 import threading
 import time
 
 import pytest
 
 import aiochan._util
+import aiochan._worker
 import aiochan.channel
+from aiochan import xform
 from aiochan import *
 from aiochan.buffers import *
 
@@ -104,7 +109,7 @@ async def test_limit_async_get_nowait_and_put_nowait1():
     c = Chan()
     for i in range(aiochan.channel.MAX_OP_QUEUE_SIZE):
         c.put_nowait(i, immediate_only=False)
-    with pytest.raises(AssertionError):
+    with pytest.raises(ChanOverflowError):
         c.put_nowait(42, immediate_only=False)
 
 
@@ -113,10 +118,42 @@ async def test_limit_async_get_nowait_and_put_nowait2():
     c = Chan()
     for i in range(aiochan.channel.MAX_OP_QUEUE_SIZE):
         c.get_nowait(lambda _: _, immediate_only=False)
-    with pytest.raises(AssertionError):
+    with pytest.raises(ChanOverflowError):
         c.get_nowait(lambda _: _, immediate_only=False)
 
 
+@pytest.mark.asyncio
+async def test_overflow_policies():
+    c = Chan(max_pending=2, overflow='shed_newest')
+    p1 = c.put(1)
+    p2 = c.put(2)
+    assert await c.put(3) is False
+    assert [1, 2] == await c.get_many(5)
+    assert await p1 and await p2
+
+    c = Chan(max_pending=2, overflow='shed_oldest')
+    p1 = c.put(1)
+    c.put(2)
+    c.put(3)
+    assert await p1 is False
+    assert [2, 3] == await c.get_many(5)
+
+    c = Chan(max_pending=2, overflow='shed_oldest')
+    g1 = c.get()
+    g2 = c.get()
+    g3 = c.get()
+    assert await g1 is None
+    await c.put_many([1, 2])
+    assert [1, 2] == [await g2, await g3]
+
+    c = Chan(max_pending=2, overflow='grow')
+    c.add(*range(1, 11))
+    assert list(range(1, 11)) == await c.get_many(10)
+
+    with pytest.raises(ValueError):
+        Chan(overflow='explode')
+
+
 @pytest.mark.asyncio
 async def test_limit_async_get_nowait_and_put_nowait3():
     c = Chan()
@@ -126,11 +163,11 @@ async def test_limit_async_get_nowait_and_put_nowait3():
             c._put(i, aiochan._util.FnHandler(None, True))
         else:
             c._put(i, aiochan._util.SelectHandler(None, flag))
-    assert c._dirty_puts == 0
+    assert len(c._puts) == 1024
     flag.commit(None)
-    assert c._dirty_puts == 512
+    assert len(c._puts) == 512
     assert c.put_nowait('last', immediate_only=False) is None
-    assert c._dirty_puts == 0
+    assert len(c._puts) == 513
     c.close()
     results = []
     while True:
@@ -157,17 +194,29 @@ async def test_limit_async_get_nowait_and_put_nowait4():
 
     for i in range(aiochan.channel.MAX_OP_QUEUE_SIZE):
         loop(i)
-    assert c._dirty_gets == 0
+    assert len(c._gets) == 1024
     flag.commit(None)
-    assert c._dirty_gets == 512
+    assert len(c._gets) == 512
     assert c.get_nowait(lambda v: results.append(('end', v)), immediate_only=False) is None
-    assert c._dirty_gets == 0
+    assert len(c._gets) == 513
     for i in range(aiochan.channel.MAX_OP_QUEUE_SIZE):
         c.add(i)
     await nop()
     assert results == list(zip(list(range(0, 1024, 2)) + ['end'], range(513)))
 
 
+@pytest.mark.asyncio
+async def test_select_losers_removed_from_queues():
+    a = Chan()
+    b = Chan()
+    for i in range(3 * aiochan.channel.MAX_OP_QUEUE_SIZE):
+        ft = select(a, b)
+        assert len(a._gets) == 1 and len(b._gets) == 1
+        b.put_nowait(i + 1, immediate_only=False)
+        assert (i + 1, b) == await ft
+        assert len(a._gets) == 0 and len(b._gets) == 0
+
+
 @pytest.mark.asyncio
 async def test_puts_fulfill_when_buffer_available():
     c = Chan(1)
@@ -196,6 +245,81 @@ async def test_offer_poll():
     assert c.get_nowait() is None
 
 
+@pytest.mark.asyncio
+async def test_immediate_ops_skip_futures():
+    c = Chan(1)
+    r = c.put(1)
+    assert not asyncio.isfuture(r)
+    assert r.done() and r.result() is True
+    assert await r is True
+    r = c.put(2)
+    assert asyncio.isfuture(r)
+    g = c.get()
+    assert not asyncio.isfuture(g)
+    assert await g == 1
+    assert await r is True
+    assert await asyncio.ensure_future(c.get()) == 2
+
+
+@pytest.mark.asyncio
+async def test_put_many_get_many():
+    c = Chan(3)
+    assert await c.put_many([1, 2, 3])
+    assert [1, 2] == await c.get_many(2)
+    assert [3] == await c.get_many(10)
+
+    r = go(c.put_many(range(1, 2001)))
+    result = []
+    while len(result) < 2000:
+        result.extend(await c.get_many(100))
+    assert result == list(range(1, 2001))
+    assert await r
+    assert len(c._puts) == 0
+
+    c.close()
+    assert [] == await c.get_many(10)
+    assert not await c.put_many([1])
+
+    c = Chan()
+    g = go(c.get_many(5))
+    await nop()
+    await c.put(1)
+    assert [1] == await g
+
+
+@pytest.mark.asyncio
+async def test_xform():
+    with pytest.raises(ValueError):
+        Chan(xform=xform.map(str))
+    with pytest.raises(ValueError):
+        Chan(0, xform=xform.map(str))
+
+    c = Chan(2, xform=xform.comp(xform.filter(lambda v: v % 2), xform.map(lambda v: v * 10), xform.group(2)))
+    ft = c.get()
+    c.add(*range(1, 6))
+    assert (await ft) == [10, 30]
+    c.close()
+    assert (await c.collect()) == [[50]]
+
+    c = Chan(1, xform=xform.take(2))
+    p1 = c.put(1)
+    p2 = c.put(2)
+    p3 = c.put(3)
+    assert (await c.get()) == 1
+    assert (await c.get()) == 2
+    assert c.closed
+    assert (await p1, await p2, await p3) == (True, True, False)
+    assert c.put_nowait(4) is False
+
+    c = Chan(1, xform=xform.group(2)).add(1, 2, 3).close()
+    assert (await c.collect()) == [[1, 2], [3]]
+
+    errors = []
+    c = Chan(4, xform=xform.map(lambda v: 1 / v), ex_handler=lambda e: errors.append(e) or 'err').add(1, 0, 2).close()
+    assert (await c.collect()) == [1.0, 'err', 0.5]
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
 @pytest.mark.asyncio
 async def test_promise_chan():
     c = Chan('p')
@@ -284,6 +408,53 @@ async def test_timeout():
     # assert elapsed < tout * 1.05
 
 
+@pytest.mark.asyncio
+async def test_op_timeouts():
+    c = Chan()
+    assert (await c.get(timeout=0.01)) is None
+    assert (await c.put(1, timeout=0.01)) is None
+    assert not c._gets and not c._puts
+    assert (await select(c, (Chan(), 1), timeout=0.01)) == (None, None)
+    assert not c._gets
+
+    ft = c.get(timeout=10)
+    c.put_nowait('x', immediate_only=False)
+    assert (await ft) == 'x'
+    assert (await c.add('y').get(timeout=0)) == 'y'
+    ft = select(c, timeout=10)
+    c.put_nowait('z', immediate_only=False)
+    assert (await ft) == ('z', c)
+
+    ft = c.get(timeout=10)
+    ft.cancel()
+    await nop()
+    assert not c._gets
+    c.close()
+    assert (await c.get(timeout=10)) is None
+
+
+@pytest.mark.asyncio
+async def test_op_timeout_cancel_does_not_drop_values():
+    c = Chan()
+    ft = c.get(timeout=10)
+    ft.cancel()
+    # the cancelled get is withdrawn at once, so a put right after it is queued instead of handed to the dead getter
+    assert not c._gets
+    assert c.put_nowait('x', immediate_only=False) is None
+    assert (await c.get()) == 'x'
+
+    async def getter():
+        return await c.get(timeout=10)
+
+    t = asyncio.ensure_future(getter())
+    await nop()
+    t.cancel()
+    c.put_nowait('y', immediate_only=False)
+    with pytest.raises(asyncio.CancelledError):
+        await t
+    assert (await c.get(timeout=0)) == 'y'
+
+
 @pytest.mark.asyncio
 async def test_async_iterator():
     c = Chan().add(*range(10)).close()
@@ -324,6 +495,24 @@ async def test_merge():
     await in1.put('x')
 
 
+@pytest.mark.asyncio
+async def test_merge_many():
+    inputs = [Chan(name='inp%s' % i) for i in range(500)]
+
+    async def producer(c, base):
+        for i in range(4):
+            await c.put(base + i)
+        c.close()
+
+    for idx, c in enumerate(inputs):
+        go(producer(c, idx * 4))
+    o = merge(*inputs)
+    assert list(range(2000)) == sorted(await o.collect())
+    assert all(not c._watchers for c in inputs)
+
+    assert [] == await merge().collect()
+
+
 @pytest.mark.asyncio
 async def test_distribute():
     inputs = [Chan(name='inp%s' % i) for i in range(3)]
@@ -332,6 +521,35 @@ async def test_distribute():
     assert set(range(20)) == set(await output.collect())
 
 
+@pytest.mark.asyncio
+async def test_pipeline():
+    p = from_range(20).pipeline().map(lambda v: v * 2).filter(lambda v: v % 3).drop(1)
+    assert isinstance(p.take(3), Pipeline)
+    assert (await p.take(3).group(2).collect()) == [[4, 8], [10]]
+    p = from_range(5).pipeline().map(lambda v: [v] * v, flatten=True).distinct().scan(operator.add)
+    assert (await p.collect()) == [1, 3, 6, 10]
+
+    out = Chan(1)
+    c = Chan()
+    assert c.pipeline().take_while(lambda v: v < 3).chan(out=out) is out
+    assert (await c.put(1)) and (await c.put(3))
+    await nop()
+    assert out.closed
+    assert (await out.collect()) == [1]
+    result = []
+    async for v in from_range(4).pipeline().drop_while(lambda v: v < 2):
+        result.append(v)
+    assert result == [2, 3]
+
+    # pipelines stand for their materialised channel in select, Selector and merge
+    assert [10, 11, 12, 99] == sorted(await merge(from_range(3).pipeline().map(lambda v: v + 10),
+                                                  from_iter([99])).collect())
+    p = from_range(3).pipeline().map(lambda v: v + 10)
+    assert (10, p.chan()) == await select(p)
+    p = from_range(3).pipeline().map(lambda v: v + 10)
+    assert (10, p.chan()) == await Selector(p, Chan()).select()
+
+
 @pytest.mark.asyncio
 async def test_dup():
     src = Chan()
@@ -507,6 +725,161 @@ async def test_async_pipe_big():
     assert list(range(0, 200, 2)) == await d.collect()
 
 
+@pytest.mark.asyncio
+async def test_async_pipe_window():
+    c = Chan().add(*range(50)).close()
+    started = []
+    started_before_head = None
+
+    async def work(n):
+        nonlocal started_before_head
+        started.append(n)
+        # the first value is by far the slowest, and holds back the window
+        if n == 0:
+            await asyncio.sleep(0.02)
+            started_before_head = len(started)
+        return n * 2
+
+    d = c.async_pipe(4, work, window=6)
+    assert list(range(0, 100, 2)) == await d.collect()
+    assert len(started) == 50
+    assert started_before_head == 6
+
+    with pytest.raises(ValueError):
+        c.async_pipe(4, work, window=3)
+
+
+@pytest.mark.asyncio
+async def test_async_pipe_window_out_closed():
+    all_tasks = asyncio.all_tasks if hasattr(asyncio, 'all_tasks') else asyncio.Task.all_tasks
+    loop = asyncio.get_event_loop()
+    before = set(all_tasks(loop))
+
+    async def work(n):
+        if n == 0:
+            await asyncio.sleep(0.01)
+        return n
+
+    # the window fills up behind the slow first value, whose result then finds `out` closed
+    Chan().add(*range(50)).close().async_pipe(2, work, Chan().close(), window=4)
+    await asyncio.sleep(0.05)
+    assert all(t.done() for t in set(all_tasks(loop)) - before)
+
+
+@pytest.mark.asyncio
+async def test_async_pipe_adaptive_limit():
+    active = 0
+    peak = 0
+
+    async def work(n):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        # the downstream handles 4 concurrent requests without slowing down
+        await asyncio.sleep(0.002 * max(1, active / 4))
+        active -= 1
+        return n
+
+    limit = AdaptiveLimit(64, initial=1)
+    assert (await from_range(1000).async_pipe(limit, work).collect()) == list(range(1000))
+    stat = limit.stats()
+    assert 2 <= stat.limit <= 24
+    assert stat.in_flight == 0 and stat.waiting == 0 and stat.min_latency >= 0.002
+    assert peak < 64
+
+    limit = AdaptiveLimit(8, initial=1)
+
+    async def fast(n):
+        await asyncio.sleep(0.001)
+        return n
+
+    assert sorted(await from_range(200).async_pipe_unordered(limit, fast).collect()) == list(range(200))
+    # grows to the maximum with flat latency, give or take a backoff on a latency spike of a loaded machine
+    assert limit.limit >= 4
+
+    limit = AdaptiveLimit(4)
+    assert (await from_range(50).parallel_pipe(limit, abs, mode='thread').collect()) == list(range(50))
+    assert sorted(await from_range(50).parallel_pipe_unordered(limit, abs, mode='thread').collect()) == list(range(50))
+    assert limit.stats().in_flight == 0
+
+
+def _fail_on_multiples_of_3(n):
+    if n % 3 == 0:
+        raise ValueError(n)
+    return n
+
+
+@pytest.mark.asyncio
+async def test_pipe_error_out_and_retries():
+    attempts = {}
+
+    async def flaky(n):
+        # fails twice on even values, always on multiples of 3
+        attempts[n] = attempts.get(n, 0) + 1
+        if n % 3 == 0 or (n % 2 == 0 and attempts[n] <= 2):
+            raise ValueError(n)
+        return n
+
+    errors = Chan(100)
+    out = from_range(30).async_pipe(2, flaky, error_out=errors, retries=2, backoff=0.001)
+    assert [n for n in range(30) if n % 3] == await out.collect()
+    failed = await errors.collect()
+    assert list(range(0, 30, 3)) == [v for v, _ in failed]
+    assert all(isinstance(exc, ValueError) for _, exc in failed)
+    assert attempts[3] == 3
+
+    attempts.clear()
+    errors = Chan(100)
+    out = from_range(30).async_pipe_unordered(2, flaky, error_out=errors, retries=1, backoff=0.001)
+    assert [n for n in range(30) if n % 2 and n % 3] == sorted(await out.collect())
+    assert [n for n in range(30) if n % 2 == 0 or n % 3 == 0] == sorted(v for v, _ in await errors.collect())
+
+    # failures neither stall the pipes nor leak their slots
+    for pipe in ('parallel_pipe', 'parallel_pipe_unordered'):
+        for chunksize in (None, 4):
+            errors = Chan(100)
+            out = getattr(from_range(60), pipe)(2, _fail_on_multiples_of_3, mode='thread', chunksize=chunksize,
+                                                error_out=errors, retries=1, backoff=0.001)
+            ok = sorted(await out.collect())
+            failed = sorted(v for v, _ in await errors.collect())
+            assert list(range(60)) == sorted(ok + failed)
+            assert set(range(0, 60, 3)) <= set(failed)
+
+    reported = []
+    loop = asyncio.get_event_loop()
+    loop.set_exception_handler(lambda _, ctx: reported.append(ctx['exception']))
+    try:
+        out = from_range(30).parallel_pipe(2, _fail_on_multiples_of_3, mode='thread')
+        assert [n for n in range(30) if n % 3] == await out.collect()
+    finally:
+        loop.set_exception_handler(None)
+    assert 10 == len(reported)
+
+
+@pytest.mark.asyncio
+async def test_pipe_cancelled_with_retries():
+    current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+
+    for pipe in ('async_pipe', 'async_pipe_unordered'):
+        started = []
+
+        async def hang(n):
+            started.append(current_task())
+            await asyncio.sleep(10)
+
+        errors = Chan(10)
+        getattr(from_range(10), pipe)(2, hang, error_out=errors, retries=3, backoff=0.001)
+        await asyncio.sleep(0.01)
+        assert 2 == len(started)
+        for t in started:
+            t.cancel()
+        await asyncio.sleep(0.01)
+        # cancellation stops the workers instead of being retried or routed as a failed value
+        assert 2 == len(started)
+        assert all(t.cancelled() for t in started)
+        assert errors.get_nowait() is None
+
+
 @pytest.mark.asyncio
 async def test_async_pipe_unordered():
     c = Chan().add(*range(100)).close()
@@ -603,6 +976,25 @@ async def test_parallel_pipe_unordered_big():
     assert set(range(0, 200, 2)) == set(await d.collect())
 
 
+@pytest.mark.asyncio
+async def test_parallel_pipe_shared_pool():
+    def work(n):
+        return threading.current_thread().name, n * 2
+
+    with WorkerPool(3, 'thread') as pool:
+        outs = [from_range(i * 10, i * 10 + 10).parallel_pipe(2, work, pool=pool) for i in range(3)]
+        outs.append(from_range(30, 40).parallel_pipe_unordered(2, work, pool=pool))
+        results = []
+        for o in outs:
+            results.append(await o.collect())
+        assert not pool.closed
+    assert pool.closed
+
+    assert [v for _, v in results[0] + results[1] + results[2]] == list(range(0, 60, 2))
+    assert sorted(v for _, v in results[3]) == list(range(60, 80, 2))
+    assert len({name for r in results for name, _ in r}) <= 3
+
+
 @pytest.mark.asyncio
 async def test_select_works_at_all():
     c = Chan().add(42).close()
@@ -636,6 +1028,109 @@ async def test_select_puts():
     assert (f_hits > 0) and (e_hits > 0)
 
 
+@pytest.mark.asyncio
+async def test_selector():
+    a = Chan(name='a')
+    b = Chan(name='b')
+    out = Chan(1)
+    sel = Selector(a, b, (out, 'x'))
+    assert (True, out) == await sel.select()
+    assert await out.get() == 'x'
+
+    sel = Selector(a, b)
+    hits = {a: 0, b: 0}
+    for i in range(100):
+        ft = sel.select()
+        assert len(a._gets) == 1 and len(b._gets) == 1
+        c = a if i % 2 else b
+        c.put_nowait(i + 1, immediate_only=False)
+        assert (i + 1, c) == await ft
+        hits[c] += 1
+        assert len(a._gets) == 0 and len(b._gets) == 0
+    assert hits[a] == hits[b] == 50
+
+    a.add(1, 2, 3, 4)
+    b.add(5, 6, 7, 8)
+    results = []
+    for _ in range(8):
+        results.append(await sel.select())
+    assert sorted(v for v, _ in results) == list(range(1, 9))
+    assert [c for _, c in results[:4]].count(a) == 2
+
+    assert (42, None) == await sel.select(default=42)
+    assert len(a._gets) == 0 and len(b._gets) == 0
+
+    ft = sel.select()
+    with pytest.raises(RuntimeError):
+        sel.select()
+    ft.cancel()
+    ft = sel.select()
+    assert len(a._gets) == 1
+    a.close()
+    assert (None, a) == await ft
+
+    # a cancelled round withdraws its ops
+    a = Chan(name='a')
+    sel = Selector(a, b)
+    ft = sel.select()
+    ft.cancel()
+    await nop()
+    assert len(a._gets) == 0 and len(b._gets) == 0
+    a.put_nowait(1, immediate_only=False)
+    assert 1 == a.get_nowait()
+
+    # a value taken before the ops are withdrawn is not lost
+    ft = sel.select()
+    ft.cancel()
+    assert a.put_nowait(2, immediate_only=False)
+    await nop()
+    assert a.get_nowait() is None
+    assert (2, a) == await sel.select()
+
+
+@pytest.mark.asyncio
+async def test_indexed_selector():
+    chans = [Chan(name='c%s' % i) for i in range(100)]
+    sel = Selector(*chans, indexed=True)
+    assert (42, None) == await sel.select(default=42)
+    assert not sel._ready
+    assert all(not c._gets for c in chans)
+
+    ft = sel.select()
+    p = chans[50].put(1)
+    assert (1, chans[50]) == await ft
+    assert await p
+
+    chans[3].add(1, 2)
+    chans[7].add(3)
+    assert list(sel._ready) == [chans[3], chans[7]]
+    results = []
+    for _ in range(3):
+        results.append(await sel.select())
+    assert results == [(1, chans[3]), (3, chans[7]), (2, chans[3])]
+
+    ft = sel.select()
+    chans[9].close()
+    assert (None, chans[9]) == await ft
+    sel.remove(chans[9])
+    assert (42, None) == await sel.select(default=42)
+
+    extra = Chan(1)
+    sel.add(extra)
+    await extra.put('x')
+    assert ('x', extra) == await sel.select()
+
+    sel.close()
+    assert all(not c._watchers for c in chans)
+
+    # put ops are rejected instead of being mistaken for channels
+    with pytest.raises(TypeError, match='indexed'):
+        Selector(chans[0], (chans[1], 1), indexed=True)
+    assert not chans[0]._watchers
+    with pytest.raises(TypeError, match='indexed'):
+        Selector(indexed=True).add((chans[1], 1))
+
+
 def test_sync_op():
     import random
     from threading import Thread
@@ -692,6 +1187,35 @@ async def test_map():
     assert list(range(0, 20, 2)) == await c.collect()
 
 
+def _double_all(vs):
+    return [v * 2 for v in vs]
+
+
+@pytest.mark.asyncio
+async def test_map_batched():
+    sizes = []
+
+    def f(vs):
+        sizes.append(len(vs))
+        return _double_all(vs)
+
+    c = from_range(10).map_batched(f, 4)
+    assert list(range(0, 20, 2)) == await c.collect()
+    assert [4, 4, 2] == sizes
+
+    src = Chan()
+    out = src.map_batched(_double_all, 100, 0.01)
+    go(src.put_many(range(5)))
+    assert list(range(0, 10, 2)) == await out.collect(5)
+    src.close()
+    assert await out.get() is None
+
+    c = from_range(100).map_batched(_double_all, 8, 0.01, parallelism=2)
+    assert list(range(0, 200, 2)) == await c.collect()
+    c = from_range(100).map_batched(_double_all, 8, parallelism=2, mode='process')
+    assert list(range(0, 200, 2)) == await c.collect()
+
+
 @pytest.mark.asyncio
 async def test_flat_map():
     c = from_range(10).map(lambda v: [v * 2], flatten=True)
@@ -704,6 +1228,95 @@ async def test_group():
     assert [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]] == await c.collect()
 
 
+@pytest.mark.asyncio
+async def test_group_within():
+    c = from_range(10).group_within(3, 10)
+    assert [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]] == await c.collect()
+
+    loop = asyncio.get_event_loop()
+    src = Chan()
+    out = src.group_within(3, 0.05)
+
+    async def trickle():
+        for v in range(5):
+            await src.put(v)
+        await asyncio.sleep(0.2)
+        await src.put(5)
+        src.close()
+
+    go(trickle())
+    assert [0, 1, 2] == await out.get()
+    start = loop.time()
+    # the second batch is emitted 0.05s after its first element, without waiting for a third element
+    assert [3, 4] == await out.get()
+    assert 0.03 < loop.time() - start < 0.15
+    assert [5] == await out.get()
+    assert await out.get() is None
+
+
+@pytest.mark.asyncio
+async def test_throttle():
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    assert list(range(20)) == await from_range(20).throttle(100, 5).collect()
+    assert loop.time() - start >= 0.14
+
+    start = loop.time()
+    assert list(range(5)) == await from_range(100).throttle(10, 5, drop=True).collect()
+    assert loop.time() - start < 0.05
+
+
+async def _bursts(c, *bursts, gap):
+    for burst in bursts:
+        for v in burst:
+            await c.put(v)
+        await asyncio.sleep(gap)
+    c.close()
+
+
+@pytest.mark.asyncio
+async def test_debounce():
+    src = Chan()
+    go(_bursts(src, [0, 1, 2], [3], [4, 5], gap=0.05))
+    assert [2, 3, 5] == await src.debounce(0.02).collect()
+
+    src = Chan()
+    go(_bursts(src, [0, 1, 2], [3], [4, 5], gap=0.005))
+    assert [5] == await src.debounce(0.05).collect()
+
+
+@pytest.mark.asyncio
+async def test_sample():
+    src = Chan()
+    go(_bursts(src, *[[v] for v in range(20)], gap=0.01))
+    r = await src.sample(0.05).collect()
+    assert 3 <= len(r) <= 6
+    assert r == sorted(r) and r[-1] == 19
+
+    src = Chan()
+    go(_bursts(src, [0, 1], [], [], [], [2], gap=0.03))
+    assert [1, 2] == await src.sample(0.02).collect()
+
+    # a buffered source with a busy producer always has a value ready
+    loop = asyncio.get_event_loop()
+    src = Chan(16)
+
+    async def busy():
+        v = 0
+        end = loop.time() + 0.3
+        while loop.time() < end:
+            await src.put(v)
+            v += 1
+            if v % 16 == 0:
+                await asyncio.sleep(0)
+        src.close()
+
+    go(busy())
+    r = await src.sample(0.02).collect()
+    assert 8 <= len(r) <= 17
+    assert r == sorted(r)
+
+
 @pytest.mark.asyncio
 async def test_group_by():
     c = from_range(10).group_by(lambda v: v // 3)
@@ -907,3 +1520,173 @@ async def test_parallel_pipe_process_big():
 
     c.parallel_pipe(2, process_work, d, mode='process')
     assert list(range(0, 200, 2)) == await d.collect()
+
+
+def process_work_flat(n):
+    return [n] * (n % 3)
+
+
+@pytest.mark.asyncio
+async def test_parallel_pipe_process_chunked():
+    expected = [v for n in range(100) for v in [n] * (n % 3)]
+    d = from_range(100).parallel_pipe(2, process_work_flat, mode='process', chunksize=16, flatten=True)
+    assert expected == await d.collect()
+
+    d = from_range(100).parallel_pipe_unordered(2, process_work, mode='process', chunksize=16)
+    assert list(range(0, 200, 2)) == sorted(await d.collect())
+
+
+class _CountedPickles:
+    pickled = 0
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getstate__(self):
+        _CountedPickles.pickled += 1
+        return self.__dict__
+
+    def __call__(self, n):
+        return self.table[n]
+
+
+@pytest.mark.asyncio
+async def test_parallel_pipe_process_register():
+    f = _CountedPickles(list(range(0, 200, 2)))
+    d = from_range(100).parallel_pipe(2, f, mode='process', register=True)
+    assert list(range(0, 200, 2)) == await d.collect()
+    assert _CountedPickles.pickled <= 2
+
+    with WorkerPool(2, register=(f,)) as pool:
+        d = from_range(100).parallel_pipe_unordered(2, f, pool=pool, chunksize=8)
+        assert list(range(0, 200, 2)) == sorted(await d.collect())
+    assert _CountedPickles.pickled <= 4
+
+    d = from_range(100).parallel_pipe(2, f, mode='process')
+    assert list(range(0, 200, 2)) == await d.collect()
+    assert _CountedPickles.pickled >= 100
+
+    # thread workers share the parent process: nothing is registered there, so nothing outlives the pool
+    d = from_range(100).parallel_pipe(2, f, mode='thread', register=True)
+    assert list(range(0, 200, 2)) == await d.collect()
+    assert id(f) not in aiochan._worker._registered
+
+
+def process_reverse(v):
+    return v[::-1]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason='shared memory requires Python 3.8')
+@pytest.mark.asyncio
+async def test_parallel_pipe_process_shm():
+    import os
+
+    with pytest.raises(ValueError):
+        Chan().parallel_pipe(2, process_reverse, transport='socket')
+
+    values = [os.urandom(aiochan._worker.SHM_THRESHOLD) for _ in range(5)] + [b'small']
+    d = from_iter(values).parallel_pipe(2, process_reverse, mode='process', transport='shm')
+    assert [v[::-1] for v in values] == await d.collect()
+
+    d = from_iter(values).parallel_pipe_unordered(2, process_reverse, mode='process', transport='shm', chunksize=4)
+    assert sorted(v[::-1] for v in values) == sorted(await d.collect())
+
+    # the type of bytes-like values is kept both ways
+    values = [bytearray(v) for v in values]
+    d = from_iter(values).parallel_pipe(2, process_reverse, mode='process', transport='shm')
+    r = await d.collect()
+    assert [v[::-1] for v in values] == r
+    assert all(type(v) is bytearray for v in r)
+
+    try:
+        import numpy
+    except ImportError:
+        return
+    arrays = [numpy.arange(i, i + (1 << 18), dtype='float64').reshape(512, -1) for i in range(4)]
+    d = from_iter(arrays).parallel_pipe(2, process_reverse, mode='process', transport='shm')
+    for a, r in zip(arrays, await d.collect()):
+        assert (a[::-1] == r).all()
+    if os.path.isdir('/dev/shm'):
+        assert not [n for n in os.listdir('/dev/shm') if n.startswith('psm_')]
+
+
+@pytest.mark.asyncio
+async def test_threadsafe_calls_coalesced():
+    loop = asyncio.get_event_loop()
+    calls = aiochan._util.ThreadsafeCalls(loop)
+    wakeups = 0
+    orig = loop.call_soon_threadsafe
+
+    def counting(*args):
+        nonlocal wakeups
+        wakeups += 1
+        return orig(*args)
+
+    loop.call_soon_threadsafe = counting
+    try:
+        got = []
+        threads = [threading.Thread(target=lambda i=i: [calls.call(got.append, (i, j)) for j in range(100)])
+                   for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        await asyncio.sleep(0)
+    finally:
+        del loop.call_soon_threadsafe
+
+    assert wakeups == 1
+    assert 400 == len(got)
+    for i in range(4):
+        assert [(i, j) for j in range(100)] == [v for v in got if v[0] == i]
+
+
+class _Counter(Actor):
+    torn_down = []
+
+    def __init__(self, start):
+        self.start = start
+        self.seen = None
+
+    def setup(self):
+        self.seen = self.start
+
+    def process(self, value):
+        if value == 'bad':
+            raise ValueError(value)
+        self.seen += 1
+        return id(self), self.seen, value
+
+    def teardown(self):
+        _Counter.torn_down.append(self.seen)
+
+
+class _Pid(Actor):
+    def process(self, value):
+        import os
+        return os.getpid(), value * 2
+
+
+@pytest.mark.asyncio
+async def test_actor_pipe():
+    _Counter.torn_down = []
+    r = await from_range(100).actor_pipe(4, _Counter, args=(0,), mode='thread').collect()
+    assert list(range(100)) == [v for _, _, v in r]
+    # each actor counts the values routed to it from its own state
+    counts = collections.Counter(a for a, _, _ in r)
+    assert len(counts) <= 4
+    assert sorted(counts.values()) == sorted(_Counter.torn_down)
+
+    # values with the same key go to the same actor
+    errors = Chan(10)
+    values = ['a', 'bb', 'bad', 'ccc', 'dd', 'e'] * 5
+    r = await from_iter(values).actor_pipe(3, _Counter, kwargs={'start': 0}, key=len, mode='thread',
+                                           error_out=errors).collect()
+    assert [v for v in values if v != 'bad'] == [v for _, _, v in r]
+    for length in (1, 2, 3):
+        assert len({a for a, _, v in r if len(v) == length}) == 1
+    assert ['bad'] * 5 == [v for v, _ in await errors.collect()]
+
+    r = await from_range(20).actor_pipe(2, _Pid).collect()
+    assert list(range(0, 40, 2)) == [v for _, v in r]
+    assert len({pid for pid, _ in r}) <= 2
@@ -0,0 +1,78 @@
+import asyncio
+import gc
+import weakref
+
+import pytest
+
+from aiochan import *
+from aiochan.timers import *
+
+
+@pytest.mark.asyncio
+async def test_timer_wheel():
+    loop = asyncio.get_event_loop()
+    wheel = TimerWheel(0.01)
+    fired = []
+    start = loop.time()
+    timers = [wheel.call_later(0.02, fired.append, i) for i in range(100)]
+    assert len(wheel) == 100
+    assert len(wheel._handles) <= 2
+    for t in timers[::2]:
+        t.cancel()
+    timers[0].cancel()
+    assert len(wheel) == 50
+    assert all(t.when >= start + 0.02 for t in timers[1::2])
+
+    await asyncio.sleep(0.05)
+    assert fired == list(range(1, 100, 2))
+    assert len(wheel) == 0 and not wheel._buckets and not wheel._handles
+    assert timers[1].when is None
+
+    wheel.call_later(0.01, fired.append, 'x').cancel()
+    assert not wheel._handles
+    assert wheel.__repr__()
+
+    # a callback cancelling a later timer of the same bucket
+    errors = []
+    loop.set_exception_handler(lambda _, ctx: errors.append(ctx))
+    try:
+        fired = []
+        later = None
+        when = loop.time() + 0.01
+        wheel.call_at(when, lambda: (fired.append(1), later.cancel()))
+        later = wheel.call_at(when, fired.append, 2)
+        await asyncio.sleep(0.03)
+    finally:
+        loop.set_exception_handler(None)
+    assert fired == [1] and not errors
+    assert len(wheel) == 0
+
+
+@pytest.mark.asyncio
+async def test_shared_wheel():
+    assert shared_wheel(0.01) is shared_wheel(0.01)
+    assert shared_wheel(0.01) is not shared_wheel(0.1)
+
+    start = asyncio.get_event_loop().time()
+    await timeout(0.02, resolution=0.01).get()
+    assert asyncio.get_event_loop().time() - start >= 0.02
+
+    ticks = tick_tock(0.01, resolution=0.01)
+    counts = []
+    for _ in range(3):
+        counts.append((await ticks.get())[0])
+    assert counts == [1, 2, 3]
+    ticks.close()
+
+
+def test_shared_wheel_does_not_keep_loop_alive():
+    refs = []
+    for _ in range(3):
+        loop = asyncio.new_event_loop()
+        shared_wheel(0.01, loop)
+        loop.close()
+        refs.append(weakref.ref(loop))
+        del loop
+    gc.collect()
+    # the cache is keyed weakly by loop, so dead loops have no entries
+    assert all(r() is None for r in refs)
@@ -0,0 +1,42 @@
+from aiochan import xform
+
+
+def transduce(xf, vals):
+    result = []
+
+    def rf(v):
+        if v is not None:
+            result.append(v)
+        return True
+
+    step = xf(rf)
+    for v in vals:
+        if not step(v):
+            break
+    step(None)
+    return result
+
+
+def test_stateless():
+    assert transduce(xform.map(lambda v: v * 2), range(1, 4)) == [2, 4, 6]
+    assert transduce(xform.filter(lambda v: v % 2), range(5)) == [1, 3]
+    assert transduce(xform.cat(), [[1, 2], [], [3]]) == [1, 2, 3]
+    assert transduce(xform.comp(xform.filter(lambda v: v % 2), xform.map(lambda v: v * 10)), range(5)) == [10, 30]
+
+
+def test_stopping():
+    assert transduce(xform.take(2), range(1, 5)) == [1, 2]
+    assert transduce(xform.take(0), range(1, 5)) == []
+    assert transduce(xform.take_while(lambda v: v < 3), range(1, 5)) == [1, 2]
+    assert transduce(xform.comp(xform.cat(), xform.take(3)), [[1, 2], [3, 4], [5]]) == [1, 2, 3]
+
+
+def test_stateful():
+    assert transduce(xform.drop(2), range(1, 5)) == [3, 4]
+    assert transduce(xform.drop_while(lambda v: v < 3), [1, 2, 3, 1]) == [3, 1]
+    assert transduce(xform.distinct(), [1, 1, 2, 1, 1]) == [1, 2, 1]
+    assert transduce(xform.group(2), range(1, 6)) == [[1, 2], [3, 4], [5]]
+    assert transduce(xform.group_by(lambda v: v // 10), [1, 2, 11, 3]) == [(0, [1, 2]), (1, [11]), (0, [3])]
+    assert transduce(xform.scan(lambda a, b: a + b), range(1, 4)) == [1, 3, 6]
+    assert transduce(xform.scan(lambda a, b: a + b, 10), range(1, 4)) == [10, 11, 13, 16]
+    assert transduce(xform.scan(lambda a, b: a + b, 10), []) == [10]
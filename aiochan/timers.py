@@ -0,0 +1,153 @@
+import asyncio
+import math
+import weakref
+
+
+class Timer:
+    """
+    A timer armed on a :class:`aiochan.timers.TimerWheel`. Returned by :meth:`aiochan.timers.TimerWheel.call_at` and
+    :meth:`aiochan.timers.TimerWheel.call_later`.
+    """
+    __slots__ = ('_wheel', '_tick', '_callback', '_args')
+
+    def __init__(self, wheel, tick, callback, args):
+        self._wheel = wheel
+        self._tick = tick
+        self._callback = callback
+        self._args = args
+
+    @property
+    def when(self):
+        """
+        The loop time at which the timer fires, or `None` if it has already fired or has been cancelled.
+        """
+        if self._tick is None:
+            return None
+        # noinspection PyProtectedMember
+        return self._tick * self._wheel._resolution
+
+    def cancel(self):
+        """
+        Cancel the timer. Does nothing if the timer has already fired or has been cancelled.
+
+        :return: `None`
+        """
+        if self._tick is not None:
+            # noinspection PyProtectedMember
+            self._wheel._cancel(self)
+            self._tick = None
+
+    def __repr__(self):
+        return '<Timer when=' + repr(self.when) + ' callback=' + repr(self._callback) + '>'
+
+
+class TimerWheel:
+    """
+    A timer service that groups deadlines into buckets of width `resolution` seconds.
+
+    All timers falling into the same bucket share a single timer on the event loop, and arming or cancelling a timer is
+    a dictionary operation. This makes it suitable for very large numbers of concurrent deadlines, at the cost of
+    precision: timers fire at the end of their bucket, i.e. up to `resolution` seconds late, but never early.
+
+    Usually a wheel is not created directly, but obtained with :func:`aiochan.timers.shared_wheel`.
+
+    :param resolution: width of the buckets, in seconds.
+    :param loop: the loop on which the timers run.
+    """
+
+    def __init__(self, resolution, *, loop=None):
+        assert resolution > 0, 'resolution must be positive'
+        # the loop is held weakly, so that the wheels cached by `shared_wheel` do not keep their loop alive
+        self._loop_ref = weakref.ref(loop or asyncio.get_event_loop())
+        self._resolution = resolution
+        self._buckets = {}
+        self._handles = {}
+        self._count = 0
+
+    @property
+    def resolution(self):
+        return self._resolution
+
+    @property
+    def _loop(self):
+        return self._loop_ref()
+
+    def call_at(self, when, callback, *args):
+        """
+        Arrange for `callback(*args)` to be called at loop time `when`, rounded up to the resolution of the wheel.
+
+        :return: a :class:`aiochan.timers.Timer` that can be cancelled.
+        """
+        tick = math.ceil(when / self._resolution)
+        bucket = self._buckets.get(tick)
+        if bucket is None:
+            bucket = self._buckets[tick] = {}
+            self._handles[tick] = self._loop.call_at(tick * self._resolution, self._fire, tick)
+        timer = Timer(self, tick, callback, args)
+        bucket[timer] = None
+        self._count += 1
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        """
+        Arrange for `callback(*args)` to be called after `delay` seconds, rounded up to the resolution of the wheel.
+
+        :return: a :class:`aiochan.timers.Timer` that can be cancelled.
+        """
+        return self.call_at(self._loop.time() + delay, callback, *args)
+
+    def _cancel(self, timer):
+        # noinspection PyProtectedMember
+        tick = timer._tick
+        bucket = self._buckets.get(tick)
+        if bucket is None or timer not in bucket:
+            # the bucket of the timer is firing, and skips the timer once it is marked as cancelled
+            return
+        del bucket[timer]
+        self._count -= 1
+        if not bucket:
+            del self._buckets[tick]
+            self._handles.pop(tick).cancel()
+
+    def _fire(self, tick):
+        del self._handles[tick]
+        bucket = self._buckets.pop(tick)
+        self._count -= len(bucket)
+        for timer in bucket:
+            if timer._tick is None:
+                # cancelled by an earlier callback of the bucket
+                continue
+            timer._tick = None
+            # noinspection PyBroadException
+            try:
+                timer._callback(*timer._args)
+            except Exception as exc:
+                self._loop.call_exception_handler({'message': 'Exception in timer callback ' + repr(timer._callback),
+                                                   'exception': exc})
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return '<TimerWheel resolution=' + repr(self._resolution) + ' pending=' + str(self._count) + '>'
+
+
+_shared_wheels = weakref.WeakKeyDictionary()
+
+
+def shared_wheel(resolution, loop=None):
+    """
+    Returns the timer wheel with the given resolution shared by all users of `loop`, creating it if necessary.
+
+    :param resolution: width of the buckets of the wheel, in seconds.
+    :param loop: the loop on which the timers run.
+    :return: the shared :class:`aiochan.timers.TimerWheel`
+    """
+    loop = loop or asyncio.get_event_loop()
+    wheels = _shared_wheels.get(loop)
+    if wheels is None:
+        wheels = _shared_wheels[loop] = {}
+    wheel = wheels.get(resolution)
+    if wheel is None:
+        wheel = wheels[resolution] = TimerWheel(resolution, loop=loop)
+    return wheel
@@ -0,0 +1,304 @@
+"""
+Transducers: composable transformations that can be attached to a channel with the `xform` parameter of
+:class:`aiochan.channel.Chan`, in which case they are applied synchronously as values are put into the channel, without
+any extra coroutine or channel.
+
+A *reducing function* `rf` is a function of one argument. `rf(v)` processes the value `v` and returns a true value if
+more values may follow, or a false value if no more values will be accepted, in which case the channel is closed.
+`rf(None)` signals completion: any state held by the function should be flushed downstream before calling the
+downstream `rf(None)`.
+
+A *transducer* is a function taking a reducing function and returning a new reducing function. Transducers compose with
+:func:`aiochan.xform.comp`, in which values flow through the transducers from left to right::
+
+    c = Chan(16, xform=xform.comp(xform.filter(lambda v: v % 2), xform.map(lambda v: v * 10), xform.take(3)))
+
+The transducers in this module mirror the channel methods of the same names, e.g. :meth:`aiochan.channel.Chan.map`.
+"""
+
+__all__ = ('comp', 'map', 'cat', 'filter', 'take', 'drop', 'take_while', 'drop_while', 'group', 'group_by',
+           'distinct', 'scan')
+
+
+def comp(*xforms):
+    """
+    Compose transducers. Values flow through `xforms` in the order given.
+
+    :param xforms: the transducers to compose.
+    :return: the composed transducer.
+    """
+
+    def xf(rf):
+        for x in reversed(xforms):
+            rf = x(rf)
+        return rf
+
+    return xf
+
+
+def map(f):
+    """
+    Transducer producing `f(v)` for each value `v`.
+
+    :param f: a function receiving one element and returning one element. Cannot return `None`.
+    """
+
+    def xf(rf):
+        def step(v):
+            if v is None:
+                return rf(None)
+            return rf(f(v))
+
+        return step
+
+    return xf
+
+
+def cat():
+    """
+    Transducer producing the individual elements of each value, which must be iterable.
+    """
+
+    def xf(rf):
+        def step(v):
+            if v is None:
+                return rf(None)
+            for el in v:
+                if not rf(el):
+                    return False
+            return True
+
+        return step
+
+    return xf
+
+
+def filter(p):
+    """
+    Transducer producing values `v` for which `p(v)` is true.
+
+    :param p: a function receiving one element and returning whether this value should be kept.
+    """
+
+    def xf(rf):
+        def step(v):
+            if v is None:
+                return rf(None)
+            if p(v):
+                return rf(v)
+            return True
+
+        return step
+
+    return xf
+
+
+def take(n):
+    """
+    Transducer producing at most `n` values, after which no more values are accepted.
+
+    :param n: how many values to take.
+    """
+
+    def xf(rf):
+        left = n
+
+        def step(v):
+            nonlocal left
+            if v is None:
+                return rf(None)
+            if left <= 0:
+                return False
+            left -= 1
+            return rf(v) and left > 0
+
+        return step
+
+    return xf
+
+
+def drop(n):
+    """
+    Transducer producing all values except the first `n`.
+
+    :param n: how many values to drop.
+    """
+
+    def xf(rf):
+        left = n
+
+        def step(v):
+            nonlocal left
+            if v is None:
+                return rf(None)
+            if left > 0:
+                left -= 1
+                return True
+            return rf(v)
+
+        return step
+
+    return xf
+
+
+def take_while(p):
+    """
+    Transducer producing values `v` until `p(v)` becomes false, after which no more values are accepted.
+
+    :param p: a function receiving one element and returning whether this value should be kept.
+    """
+
+    def xf(rf):
+        def step(v):
+            if v is None:
+                return rf(None)
+            if not p(v):
+                return False
+            return rf(v)
+
+        return step
+
+    return xf
+
+
+def drop_while(p):
+    """
+    Transducer producing values `v` after `p(v)` becomes false for the first time.
+
+    :param p: a function receiving one element and returning whether this value should be dropped.
+    """
+
+    def xf(rf):
+        dropping = True
+
+        def step(v):
+            nonlocal dropping
+            if v is None:
+                return rf(None)
+            if dropping:
+                if p(v):
+                    return True
+                dropping = False
+            return rf(v)
+
+        return step
+
+    return xf
+
+
+def group(n):
+    """
+    Transducer producing lists of `n` consecutive values. On completion, the last list may hold less than `n` values.
+
+    :param n: the size of the batch
+    """
+
+    def xf(rf):
+        batched = []
+
+        def step(v):
+            nonlocal batched
+            if v is None:
+                if batched:
+                    rf(batched)
+                    batched = []
+                return rf(None)
+            batched.append(v)
+            if len(batched) == n:
+                full, batched = batched, []
+                return rf(full)
+            return True
+
+        return step
+
+    return xf
+
+
+def group_by(f):
+    """
+    Transducer producing `(group_key, [elements...])` where `group_key` is the result of `f` applied to the values
+    and `elements ...` are consecutive values with the same `group_key`.
+
+    :param f: the key function
+    """
+
+    def xf(rf):
+        last_key = object()
+        buffered = []
+
+        def step(v):
+            nonlocal last_key, buffered
+            if v is None:
+                if buffered:
+                    rf((last_key, buffered))
+                    buffered = []
+                return rf(None)
+            cur_key = f(v)
+            if cur_key == last_key:
+                buffered.append(v)
+                return True
+            done, buffered, prev_key, last_key = buffered, [v], last_key, cur_key
+            if done:
+                return rf((prev_key, done))
+            return True
+
+        return step
+
+    return xf
+
+
+def distinct():
+    """
+    Transducer dropping consecutive duplicate values.
+    """
+
+    def xf(rf):
+        last = None
+
+        def step(v):
+            nonlocal last
+            if v is None:
+                return rf(None)
+            if v != last:
+                last = v
+                return rf(v)
+            return True
+
+        return step
+
+    return xf
+
+
+def scan(f, init=None):
+    """
+    Transducer producing the intermediate accumulators of a left-fold over the values.
+
+    :param f: a function taking two arguments `accumulator` and `next_value` and returning
+              `new_accumulator`.
+    :param init: if given, will be produced first and used as the initial accumulator. If not given, the first value
+                 will be used instead.
+    """
+
+    def xf(rf):
+        acc = init
+        started = False
+
+        def step(v):
+            nonlocal acc, started
+            if v is None:
+                if not started and acc is not None:
+                    rf(acc)
+                return rf(None)
+            if not started:
+                started = True
+                if acc is None:
+                    acc = v
+                    return rf(acc)
+                if not rf(acc):
+                    return False
+            acc = f(acc, v)
+            return rf(acc)
+
+        return step
+
+    return xf
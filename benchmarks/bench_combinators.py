@@ -0,0 +1,280 @@
+"""
+Benchmarks for the higher level combinators: merge, Dup, Pub, pipes, transformation chains and to_iterable.
+"""
+
+import asyncio
+import threading
+
+from aiochan import Actor, Chan, Dup, Pub, WorkerPool, from_range, go, merge, nop, xform
+from harness import benchmark
+
+
+def _double(v):
+    return v * 2
+
+
+@benchmark('merge', n=20000, width=2)
+@benchmark('merge', n=20000, width=10)
+@benchmark('merge', n=20000, width=100)
+@benchmark('merge', n=10000, width=500)
+async def merge_(n, width):
+    inputs = [Chan() for _ in range(width)]
+    # at least one value per input, so that small scales still measure something
+    per_input = max(1, n // width)
+
+    async def producer(c):
+        for i in range(1, per_input + 1):
+            await c.put(i)
+        c.close()
+
+    for c in inputs:
+        go(producer(c))
+    out = merge(*inputs)
+    ct = 0
+    async for _ in out:
+        ct += 1
+    return ct
+
+
+@benchmark('chain', n=20000, mode='methods')
+@benchmark('chain', n=20000, mode='pipeline')
+@benchmark('chain', n=20000, mode='xform')
+async def chain(n, mode):
+    # a 5 stage transformation, as chained channel methods, as a fused pipeline or as a transducer on the channel
+    if mode == 'xform':
+        out = Chan(64, xform=xform.comp(xform.map(_double), xform.filter(bool), xform.map(_double), xform.drop(1),
+                                        xform.distinct()))
+        go(out.put_many(range(n))).add_done_callback(lambda _: out.close())
+    else:
+        src = from_range(n)
+        if mode == 'pipeline':
+            src = src.pipeline()
+        out = src.map(_double).filter(bool).map(_double).drop(1).distinct()
+    ct = 0
+    async for _ in out:
+        ct += 1
+    return n
+
+
+def _double_all(vs):
+    return [v * 2 for v in vs]
+
+
+@benchmark('map_batched', n=20000, batch=None, parallelism=None)
+@benchmark('map_batched', n=20000, batch=64, parallelism=None)
+@benchmark('map_batched', n=5000, batch=None, parallelism=4)
+@benchmark('map_batched', n=20000, batch=64, parallelism=4)
+async def map_batched(n, batch, parallelism):
+    # per value map or parallel_pipe when batch is None, map_batched otherwise
+    src = from_range(n)
+    if batch is None:
+        out = src.map(_double) if parallelism is None else src.parallel_pipe(parallelism, _double, mode='thread')
+    else:
+        out = src.map_batched(_double_all, batch, 0.001, parallelism=parallelism)
+    return len(await out.collect())
+
+
+async def _bursty(out, n, burst, gap):
+    # puts `n` values into `out` in bursts of `burst` values, `gap` seconds apart
+    for start in range(0, n, burst):
+        await out.put_many(range(start, min(n, start + burst)))
+        await asyncio.sleep(gap)
+    out.close()
+
+
+@benchmark('rate_control', n=20000, op=None)
+@benchmark('rate_control', n=20000, op='throttle')
+@benchmark('rate_control', n=20000, op='debounce')
+@benchmark('rate_control', n=20000, op='sample')
+async def rate_control(n, op):
+    # shedding a fast, bursty source: 20 bursts 2ms apart, each faster than any of the intervals. With op=None the
+    # source is only drained, as a baseline.
+    src = Chan(64)
+    go(_bursty(src, n, n // 20, 0.002))
+    if op == 'throttle':
+        out = src.throttle(1000, 10, drop=True)
+    elif op == 'debounce':
+        out = src.debounce(0.001)
+    elif op == 'sample':
+        out = src.sample(0.001)
+    else:
+        out = src
+    emitted = len(await out.collect())
+    assert op is None or 1 < emitted < n // 10, emitted
+    return n
+
+
+@benchmark('group', n=20000, size=64, within=False)
+@benchmark('group', n=20000, size=64, within=True)
+async def group(n, size, within):
+    # batching a fast source, where batches fill up before the deadline of group_within
+    src = from_range(n)
+    out = src.group_within(size, 1) if within else src.group(size)
+    ct = 0
+    async for batch in out:
+        ct += len(batch)
+    return ct
+
+
+@benchmark('dup', n=20000, taps=4)
+async def dup(n, taps):
+    src = Chan()
+    d = Dup(src)
+    outs = [d.tap(Chan(16)) for _ in range(taps)]
+
+    async def drain(c):
+        ct = 0
+        async for _ in c:
+            ct += 1
+        return ct
+
+    drains = [go(drain(c)) for c in outs]
+    for i in range(1, n + 1):
+        await src.put(i)
+    src.close()
+    return sum(await asyncio.gather(*drains))
+
+
+@benchmark('pub', n=20000, topics=4)
+async def pub(n, topics):
+    src = Chan()
+    p = Pub(src, topic_fn=lambda v: v % topics)
+    outs = [p.sub(t, Chan(16)) for t in range(topics)]
+    per_topic = n // topics
+
+    async def drain(c):
+        for _ in range(per_topic):
+            await c.get()
+        return per_topic
+
+    drains = [go(drain(c)) for c in outs]
+    for i in range(per_topic * topics):
+        await src.put(i)
+    return sum(await asyncio.gather(*drains))
+
+
+@benchmark('async_pipe', n=20000, parallelism=8)
+async def async_pipe(n, parallelism):
+    async def work(v):
+        return v * 2
+
+    return len(await from_range(n).async_pipe(parallelism, work).collect())
+
+
+@benchmark('async_pipe_unordered', n=20000, parallelism=8)
+async def async_pipe_unordered(n, parallelism):
+    async def work(v):
+        return v * 2
+
+    return len(await from_range(n).async_pipe_unordered(parallelism, work).collect())
+
+
+@benchmark('parallel_pipe', n=5000, parallelism=4, mode='thread', chunksize=None)
+@benchmark('parallel_pipe', n=2000, parallelism=4, mode='process', chunksize=None)
+@benchmark('parallel_pipe', n=20000, parallelism=4, mode='process', chunksize=64)
+async def parallel_pipe(n, parallelism, mode, chunksize):
+    return len(await from_range(n).parallel_pipe(parallelism, _double, mode=mode, chunksize=chunksize).collect())
+
+
+@benchmark('parallel_pipe_unordered', n=5000, parallelism=4, mode='thread', chunksize=None)
+@benchmark('parallel_pipe_unordered', n=2000, parallelism=4, mode='process', chunksize=None)
+@benchmark('parallel_pipe_unordered', n=20000, parallelism=4, mode='process', chunksize=64)
+async def parallel_pipe_unordered(n, parallelism, mode, chunksize):
+    return len(await from_range(n).parallel_pipe_unordered(parallelism, _double, mode=mode,
+                                                           chunksize=chunksize).collect())
+
+
+class _Lookup:
+    # stands in for a function closing over a large table or model
+    def __init__(self, size):
+        self.table = list(range(size))
+
+    def __call__(self, v):
+        return self.table[v % len(self.table)]
+
+
+@benchmark('parallel_pipe_heavy_f', n=1000, parallelism=4, register=False)
+@benchmark('parallel_pipe_heavy_f', n=1000, parallelism=4, register=True)
+async def parallel_pipe_heavy_f(n, parallelism, register):
+    f = _Lookup(100000)
+    return len(await from_range(n).parallel_pipe(parallelism, f, mode='process', register=register).collect())
+
+
+class _LookupActor(Actor):
+    # builds the table once in each worker
+    def __init__(self, size):
+        self.size = size
+        self.table = None
+
+    def setup(self):
+        self.table = list(range(self.size))
+
+    def process(self, v):
+        return self.table[v % self.size]
+
+
+@benchmark('actor_pipe', n=1000, parallelism=4)
+async def actor_pipe(n, parallelism):
+    return len(await from_range(n).actor_pipe(parallelism, _LookupActor, args=(100000,)).collect())
+
+
+def _checksum(a):
+    # a cheap function of a large array, returning an array of the same size
+    return a[::-1]
+
+
+def _make_array(size_mb):
+    try:
+        import numpy
+    except ImportError:
+        return bytes(size_mb << 20)
+    return numpy.ones(size_mb << 17, dtype='float64')
+
+
+@benchmark('parallel_pipe_large', n=200, size_mb=1, transport='pipe')
+@benchmark('parallel_pipe_large', n=200, size_mb=1, transport='shm')
+@benchmark('parallel_pipe_large', n=40, size_mb=10, transport='pipe')
+@benchmark('parallel_pipe_large', n=40, size_mb=10, transport='shm')
+@benchmark('parallel_pipe_large', n=8, size_mb=100, transport='pipe')
+@benchmark('parallel_pipe_large', n=8, size_mb=100, transport='shm')
+async def parallel_pipe_large(n, size_mb, transport):
+    # numpy arrays of `size_mb` MB when numpy is installed, bytes otherwise
+    a = _make_array(size_mb)
+    src = Chan(2)
+    go(src.put_many(a for _ in range(n))).add_done_callback(lambda _: src.close())
+    return len(await src.parallel_pipe(2, _checksum, mode='process', transport=transport).collect())
+
+
+@benchmark('parallel_pipe_per_job', n=2000, parallelism=4, mode='process', jobs=20, shared=False)
+@benchmark('parallel_pipe_per_job', n=2000, parallelism=4, mode='process', jobs=20, shared=True)
+async def parallel_pipe_per_job(n, parallelism, mode, jobs, shared):
+    # many small pipelines, as when a service builds one pipeline per request
+    pool = WorkerPool(parallelism, mode) if shared else None
+    ct = 0
+    for j in range(jobs):
+        ct += len(await from_range(n // jobs).parallel_pipe(parallelism, _double, mode=mode, pool=pool).collect())
+    if pool is not None:
+        pool.close()
+    return ct
+
+
+@benchmark('to_iterable', n=20000, buffer_size=1)
+@benchmark('to_iterable', n=20000, buffer_size=64)
+async def to_iterable(n, buffer_size):
+    producer_loop = asyncio.new_event_loop()
+    c = Chan(loop=producer_loop)
+    it = c.to_iterable(buffer_size)
+
+    async def produce():
+        for i in range(1, n + 1):
+            await c.put(i)
+        c.close()
+        await c.join()
+        await nop()
+
+    thread = threading.Thread(target=producer_loop.run_until_complete, args=(produce(),))
+    thread.start()
+    ct = await asyncio.get_event_loop().run_in_executor(None, lambda: sum(1 for _ in it))
+    thread.join()
+    producer_loop.close()
+    return ct
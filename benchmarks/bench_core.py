@@ -0,0 +1,106 @@
+"""
+Benchmarks for the channel core: put/get ping-pong and select.
+"""
+
+import time
+
+from aiochan import Chan, Selector, go, select, timeout
+from harness import benchmark
+
+
+@benchmark('pingpong', n=50000, buffer=None)
+@benchmark('pingpong', n=50000, buffer=1)
+@benchmark('pingpong', n=50000, buffer=64)
+async def pingpong(n, buffer):
+    ping = Chan(buffer)
+    pong = Chan(buffer)
+
+    async def echo():
+        async for v in ping:
+            await pong.put(v)
+        pong.close()
+
+    go(echo())
+    latencies = []
+    clock = time.perf_counter
+    for i in range(1, n + 1):
+        start = clock()
+        await ping.put(i)
+        await pong.get()
+        latencies.append(clock() - start)
+    ping.close()
+    return n, latencies
+
+
+@benchmark('put_get_buffered', n=200000, buffer=64)
+async def put_get_buffered(n, buffer):
+    c = Chan(buffer)
+    for _ in range(n // buffer):
+        for i in range(1, buffer + 1):
+            await c.put(i)
+        for _ in range(buffer):
+            await c.get()
+    return 2 * (n // buffer) * buffer
+
+
+@benchmark('select_get', n=20000, width=2)
+@benchmark('select_get', n=20000, width=10)
+@benchmark('select_get', n=5000, width=100)
+@benchmark('select_get', n=1000, width=1000)
+async def select_get(n, width):
+    chans = [Chan() for _ in range(width)]
+    latencies = []
+    clock = time.perf_counter
+    for i in range(n):
+        start = clock()
+        ft = select(*chans)
+        chans[i % width].put_nowait(i + 1, immediate_only=False)
+        await ft
+        latencies.append(clock() - start)
+    return n, latencies
+
+
+@benchmark('select_ready', n=20000, width=2)
+@benchmark('select_ready', n=5000, width=100)
+@benchmark('select_ready', n=1000, width=1000)
+async def select_ready(n, width):
+    chans = [Chan(1) for _ in range(width)]
+    for i in range(n):
+        chans[i % width].put_nowait(i + 1)
+        await select(*chans)
+    return n
+
+
+@benchmark('selector_get', n=20000, width=2)
+@benchmark('selector_get', n=20000, width=10)
+@benchmark('selector_get', n=5000, width=100)
+@benchmark('selector_get', n=1000, width=1000)
+@benchmark('selector_get', n=20000, width=10, indexed=True)
+@benchmark('selector_get', n=20000, width=1000, indexed=True)
+@benchmark('selector_get', n=20000, width=10000, indexed=True)
+async def selector_get(n, width, indexed=False):
+    chans = [Chan() for _ in range(width)]
+    sel = Selector(*chans, indexed=indexed)
+    # drain the initial ready set of an indexed selector
+    await sel.select(default=False)
+    latencies = []
+    clock = time.perf_counter
+    for i in range(n):
+        start = clock()
+        ft = sel.select()
+        chans[i % width].put_nowait(i + 1, immediate_only=False)
+        await ft
+        latencies.append(clock() - start)
+    return n, latencies
+
+
+@benchmark('timeouts', n=100000, resolution=None)
+@benchmark('timeouts', n=100000, resolution=0.01)
+async def timeouts(n, resolution):
+    # many in-flight deadlines, almost all of which are abandoned before they fire
+    chans = [timeout(10, resolution=resolution) for _ in range(n)]
+    short = [timeout(0.001 * (i % 10), resolution=resolution) for i in range(n // 100)]
+    for c in short:
+        await c.get()
+    del chans
+    return n + len(short)
@@ -0,0 +1,81 @@
+"""
+Minimal benchmark harness shared by the benchmark modules.
+
+A benchmark is an async function registered with :func:`benchmark`. It receives the number of operations to perform
+as `n` plus its registered parameters, and returns either the number of operations actually performed, or a tuple
+`(ops, latencies)` where `latencies` is a list of per-operation latencies in seconds.
+"""
+
+import asyncio
+import collections
+import gc
+import statistics
+import time
+
+Benchmark = collections.namedtuple('Benchmark', 'name fn n params')
+
+REGISTRY = []
+
+
+def benchmark(name, n=10000, **params):
+    """
+    Register the decorated coroutine function as a benchmark. May be stacked to register several parameterisations
+    of the same function.
+    """
+
+    def deco(fn):
+        REGISTRY.append(Benchmark(name=name, fn=fn, n=n, params=params))
+        return fn
+
+    return deco
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+    return samples[idx]
+
+
+def run_one(bench, repeat=3, scale=1.0):
+    """
+    Run a single benchmark `repeat` times, each time on a fresh event loop, and return a JSON-serialisable dict.
+    """
+    n = max(1, int(bench.n * scale))
+    rates = []
+    latencies = []
+    for _ in range(repeat):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        gc.collect()
+        try:
+            start = time.perf_counter()
+            ret = loop.run_until_complete(bench.fn(n, **bench.params))
+            elapsed = time.perf_counter() - start
+        finally:
+            for task in asyncio.all_tasks(loop) if hasattr(asyncio, 'all_tasks') else asyncio.Task.all_tasks(loop):
+                task.cancel()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+        if isinstance(ret, tuple):
+            ops, lat = ret
+            latencies.extend(lat)
+        else:
+            ops = ret
+        rates.append(ops / elapsed)
+    result = {'name': bench.name,
+              'params': bench.params,
+              'n': n,
+              'ops_per_sec': statistics.median(rates),
+              'ops_per_sec_best': max(rates)}
+    if latencies:
+        result['latency'] = {'p50': percentile(latencies, 0.5),
+                             'p90': percentile(latencies, 0.9),
+                             'p99': percentile(latencies, 0.99),
+                             'max': max(latencies)}
+    return result
+
+
+def bench_key(result):
+    return result['name'] + '[' + ','.join('%s=%s' % kv for kv in sorted(result['params'].items())) + ']'
@@ -0,0 +1,341 @@
+"""
+Load scenarios derived from `examples/concurrency_patterns` and `examples/dining_philosophers.py`.
+
+Each scenario runs a realistic aiochan workload for a fixed duration and reports throughput, latency percentiles and
+event-loop lag (how late a periodic probe coroutine is woken up). Scenario parameters can be swept to see how
+aiochan scales with N.
+
+Usage::
+
+    python benchmarks/load.py boring --goroutines 1000
+    python benchmarks/load.py fan_in --sweep width=2,10,100,1000
+    python benchmarks/load.py search --replicas 3 --concurrency 100 --duration 10 -o search.json
+
+Available scenarios: boring, fan_in, select_timeout, search, philosophers, downstream.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# make the checkout's aiochan and the harness importable without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiochan import AdaptiveLimit, Chan, go, merge, nop, select, timeout  # noqa: E402
+from harness import percentile  # noqa: E402
+
+SCENARIOS = {}
+
+
+def scenario(**defaults):
+    def deco(fn):
+        SCENARIOS[fn.__name__] = (fn, defaults)
+        return fn
+
+    return deco
+
+
+class Recorder:
+    def __init__(self):
+        self.count = 0
+        self.latencies = []
+
+    def record(self, started):
+        self.count += 1
+        self.latencies.append(time.perf_counter() - started)
+
+
+async def sleep_random(max_delay):
+    # the examples wait on `timeout(random.random())`; keep the same shape but allow a zero delay for pure load
+    if max_delay:
+        await timeout(random.uniform(0, max_delay)).get()
+    else:
+        await nop()
+
+
+# 1-boring, 2-channel, 3-generator: many independent generators, one consumer per generator
+
+@scenario(goroutines=100, max_delay=0.0)
+async def boring(rec, stop, goroutines, max_delay):
+    async def generator(c):
+        while not stop.closed:
+            if not await c.put(time.perf_counter()):
+                break
+            await sleep_random(max_delay)
+
+    async def consumer(c):
+        async for started in c:
+            rec.record(started)
+
+    chans = [Chan() for _ in range(goroutines)]
+    for c in chans:
+        go(generator(c))
+        go(consumer(c))
+    await stop.join()
+    for c in chans:
+        c.close()
+
+
+# 4-multiplexing and 5-select/example1: `width` generators fanned in through select into a single consumer
+
+@scenario(width=10, max_delay=0.0, use_merge=0)
+async def fan_in(rec, stop, width, max_delay, use_merge):
+    async def generator(c):
+        while not stop.closed:
+            if not await c.put(time.perf_counter()):
+                break
+            await sleep_random(max_delay)
+        c.close()
+
+    inputs = [Chan() for _ in range(width)]
+    tasks = [go(generator(c)) for c in inputs]
+
+    if use_merge:
+        out = merge(*inputs)
+    else:
+        out = Chan()
+
+        async def multiplex():
+            while not stop.closed:
+                v, _ = await select(*inputs)
+                if v is None or not await out.put(v):
+                    break
+            out.close()
+
+        tasks.append(go(multiplex()))
+
+    async for started in out:
+        rec.record(started)
+        if stop.closed:
+            break
+    # closing leaves pending puts in place, so drain the channels to release whoever is blocked putting into them
+    for c in [out] + inputs:
+        c.close()
+        async for _ in c:
+            pass
+    await asyncio.gather(*tasks)
+
+
+# 5-select/example2: every get is guarded by a fresh timeout channel, or by the built-in timeout if `builtin`
+
+@scenario(goroutines=100, max_delay=0.0, tout=0.8, builtin=0)
+async def select_timeout(rec, stop, goroutines, max_delay, tout, builtin):
+    async def generator(c):
+        while not stop.closed:
+            if not await c.put(time.perf_counter()):
+                break
+            await sleep_random(max_delay)
+
+    async def consumer(c):
+        while not stop.closed:
+            if builtin:
+                v, ch = await c.get(timeout=tout), c
+            else:
+                v, ch = await select(c, timeout(tout))
+            if ch is c and v is not None:
+                rec.record(v)
+
+    chans = [Chan() for _ in range(goroutines)]
+    for c in chans:
+        go(generator(c))
+        go(consumer(c))
+    await stop.join()
+    for c in chans:
+        c.close()
+
+
+# 6-search/example5: replicated backends, first replica wins, global deadline per query
+
+@scenario(concurrency=50, kinds=3, replicas=2, max_delay=0.01, deadline=0.08)
+async def search(rec, stop, concurrency, kinds, replicas, max_delay, deadline):
+    async def fake_search(kind, query):
+        await sleep_random(max_delay)
+        return '%s result for %s' % (kind, query)
+
+    async def first(kind, query):
+        # buffered so that the losing replicas do not leak blocked coroutines
+        c = Chan(replicas)
+
+        async def search_replica():
+            await c.put(await fake_search(kind, query))
+
+        for _ in range(replicas):
+            go(search_replica())
+        return await c.get()
+
+    async def query(q):
+        c = Chan(kinds)
+
+        async def worker(kind):
+            await c.put(await first(kind, q))
+
+        for k in range(kinds):
+            go(worker(k))
+        tout = timeout(deadline)
+        results = []
+        for _ in range(kinds):
+            r, ch = await select(c, tout)
+            if ch is tout:
+                break
+            results.append(r)
+        return results
+
+    async def client():
+        q = 0
+        while not stop.closed:
+            started = time.perf_counter()
+            await query(q)
+            rec.record(started)
+            q += 1
+
+    clients = [go(client()) for _ in range(concurrency)]
+    await asyncio.gather(*clients)
+    # let the replicas still in flight finish
+    await asyncio.sleep(max_delay + 0.01)
+
+
+# dining philosophers: throughput is meals per second, latency is time from sitting down to eating
+
+@scenario(philosophers=5, max_delay=0.0)
+async def philosophers(rec, stop, philosophers, max_delay):
+    forks = [Chan(1).add('fork %s' % i) for i in range(philosophers)]
+
+    async def philosopher(left, right):
+        started = time.perf_counter()
+        while not stop.closed:
+            await sleep_random(max_delay)
+            left_fork, _ = await select(left, default=False)
+            right_fork, _ = await select(right, default=False)
+            if left_fork and right_fork:
+                rec.record(started)
+                await sleep_random(max_delay)
+                started = time.perf_counter()
+            for slot, fork in ((left, left_fork), (right, right_fork)):
+                if fork:
+                    await slot.put(fork)
+
+    eaters = [go(philosopher(forks[i], forks[(i + 1) % philosophers])) for i in range(philosophers)]
+    await asyncio.gather(*eaters)
+
+
+# async_pipe in front of a downstream service that slows down beyond `capacity` concurrent requests. `n=0` uses an
+# AdaptiveLimit of at most `max_n` instead of a fixed parallelism.
+
+@scenario(n=64, max_n=64, capacity=8, service_time=0.002)
+async def downstream(rec, stop, n, max_n, capacity, service_time):
+    active = 0
+
+    async def call(_):
+        # latency is measured at the downstream service, as the requests themselves are always queued
+        nonlocal active
+        started = time.perf_counter()
+        active += 1
+        await asyncio.sleep(service_time * max(1.0, active / capacity))
+        active -= 1
+        return started
+
+    async def requests():
+        while not stop.closed:
+            if not await src.put(True):
+                break
+        src.close()
+
+    src = Chan(max_n)
+    go(requests())
+    limit = AdaptiveLimit(max_n) if n == 0 else n
+    async for started in src.async_pipe_unordered(limit, call):
+        rec.record(started)
+
+
+async def loop_lag_monitor(stop, interval, lags):
+    loop = asyncio.get_event_loop()
+    while not stop.closed:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run_scenario(name, duration, lag_interval, params):
+    fn, _ = SCENARIOS[name]
+    rec = Recorder()
+    stop = Chan()
+    lags = []
+    monitor = go(loop_lag_monitor(stop, lag_interval, lags))
+    asyncio.get_event_loop().call_later(duration, stop.close)
+    started = time.perf_counter()
+    await fn(rec, stop, **params)
+    elapsed = time.perf_counter() - started
+    await monitor
+
+    def ms(v):
+        return None if v is None else v * 1000
+
+    return {'scenario': name,
+            'params': params,
+            'duration': elapsed,
+            'ops': rec.count,
+            'ops_per_sec': rec.count / elapsed,
+            'latency_ms': {'p50': ms(percentile(rec.latencies, 0.5)),
+                           'p99': ms(percentile(rec.latencies, 0.99)),
+                           'p999': ms(percentile(rec.latencies, 0.999)),
+                           'max': ms(max(rec.latencies) if rec.latencies else None)},
+            'loop_lag_ms': {'p50': ms(percentile(lags, 0.5)),
+                            'p99': ms(percentile(lags, 0.99)),
+                            'max': ms(max(lags) if lags else None)}}
+
+
+def format_result(r):
+    def f(v):
+        return '     -' if v is None else '%6.2f' % v
+
+    params = ','.join('%s=%s' % kv for kv in sorted(r['params'].items()))
+    return '%-14s %-45s %10.0f ops/s  lat p50 %s p99 %s ms  lag p99 %s max %s ms' % (
+        r['scenario'], params, r['ops_per_sec'], f(r['latency_ms']['p50']), f(r['latency_ms']['p99']),
+        f(r['loop_lag_ms']['p99']), f(r['loop_lag_ms']['max']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='load.py')
+    parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds to run each configuration')
+    parser.add_argument('--lag-interval', type=float, default=0.01, help='period of the event-loop lag probe')
+    parser.add_argument('--sweep', help='PARAM=V1,V2,... run the scenario once for each value of PARAM')
+    parser.add_argument('-o', dest='output', help='write all results as JSON to this file')
+    args, rest = parser.parse_known_args(argv)
+
+    _, defaults = SCENARIOS[args.scenario]
+    param_parser = argparse.ArgumentParser(prog='load.py ' + args.scenario)
+    for k, v in defaults.items():
+        param_parser.add_argument('--' + k.replace('_', '-'), dest=k, type=type(v), default=v)
+    params = vars(param_parser.parse_args(rest))
+
+    configs = [params]
+    if args.sweep:
+        key, values = args.sweep.split('=', 1)
+        configs = []
+        for v in values.split(','):
+            p = dict(params)
+            p[key] = type(defaults[key])(v)
+            configs.append(p)
+
+    results = []
+    for p in configs:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        r = loop.run_until_complete(run_scenario(args.scenario, args.duration, args.lag_interval, p))
+        loop.close()
+        results.append(r)
+        print(format_result(r))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Run the aiochan benchmark suite and optionally compare against a previous run.
+
+Usage::
+
+    python benchmarks/run.py [-k FILTER] [--repeat 3] [--scale 1.0] [-o results.json]
+    python benchmarks/run.py compare baseline.json current.json [--threshold 0.1]
+
+Results are emitted as JSON (to stdout, or to the file given by `-o`). `compare` prints the relative change in ops/sec
+for every benchmark present in both runs and exits with status 1 if any of them regressed by more than `threshold`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+
+# make the checkout's aiochan and the harness importable without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+BENCH_MODULES = ['bench_core', 'bench_combinators']
+
+
+def load_all():
+    for name in BENCH_MODULES:
+        __import__(name)
+    return harness.REGISTRY
+
+
+def run(args):
+    results = []
+    for bench in load_all():
+        if args.filter and not any(f in bench.name for f in args.filter):
+            continue
+        r = harness.run_one(bench, repeat=args.repeat, scale=args.scale)
+        results.append(r)
+        line = '%-50s %12.0f ops/s' % (harness.bench_key(r), r['ops_per_sec'])
+        if 'latency' in r:
+            line += '   p50 %8.1fus  p99 %8.1fus' % (r['latency']['p50'] * 1e6, r['latency']['p99'] * 1e6)
+        print(line, file=sys.stderr)
+    report = {'python': platform.python_version(),
+              'implementation': platform.python_implementation(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = {harness.bench_key(r): r for r in json.load(f)['results']}
+    with open(args.current) as f:
+        current = {harness.bench_key(r): r for r in json.load(f)['results']}
+    regressed = []
+    for key in sorted(set(baseline) & set(current)):
+        old = baseline[key]['ops_per_sec']
+        new = current[key]['ops_per_sec']
+        if not old:
+            # a benchmark that did no work in the baseline has no relative change
+            print('%-50s %12.0f -> %12.0f ops/s' % (key, old, new))
+            continue
+        change = (new - old) / old
+        flag = ''
+        if change < -args.threshold:
+            flag = '  REGRESSION'
+            regressed.append(key)
+        print('%-50s %12.0f -> %12.0f ops/s  %+7.1f%%%s' % (key, old, new, change * 100, flag))
+    for key in sorted(set(baseline) ^ set(current)):
+        print('%-50s only in %s' % (key, 'baseline' if key in baseline else 'current'))
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'compare':
+        parser = argparse.ArgumentParser(prog='run.py compare')
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='relative ops/sec drop reported as a regression')
+        return compare(parser.parse_args(argv[1:]))
+
+    parser = argparse.ArgumentParser(prog='run.py')
+    parser.add_argument('-k', dest='filter', action='append', help='only run benchmarks whose name contains FILTER')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the number of operations by SCALE')
+    parser.add_argument('-o', dest='output', help='write the JSON report to this file instead of stdout')
+    run(parser.parse_args(argv))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())